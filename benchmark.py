@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import kasumi
+import rc4
+from spongeHash import sponge_hash
+
+"""
+    Throughput benchmark of the symmetric primitives
+        : kasumi cipher / decipher of each block mode
+        : rc4 cipher
+        : sponge hash
+
+    > The results are printed as JSON. When a baseline file is given, every
+        throughput lower than the baseline one by more than the threshold
+        is reported as a regression (exit code 1)
+"""
+
+
+BLOCK_CIPHER_TYPES = ["ECB", "CBC", "PCBC", "CTR"]
+DEFAULT_SIZES = [64, 1024, 16384, 262144]
+DEFAULT_REPEAT = 10
+DEFAULT_THRESHOLD = 0.25
+
+
+"""
+    Returns the p-th percentile (nearest rank) of the sorted list 'values'
+"""
+
+
+def percentile(values, p):
+    rank = max(1, round(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+"""
+    Times 'repeat' calls of 'function' on a 'size' bytes input
+"""
+
+
+def measure(name, size, function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    total_time = sum(latencies)
+    return {"name": name,
+            "size": size,
+            "calls": repeat,
+            "mb_per_s": size * repeat / total_time / 2 ** 20,
+            "blocks_per_s": size / kasumi.BLOC_SIZE_BYTES * repeat / total_time,
+            "latency_ms": {"min": latencies[0] * 1000,
+                           "p50": percentile(latencies, 50) * 1000,
+                           "p90": percentile(latencies, 90) * 1000,
+                           "p99": percentile(latencies, 99) * 1000}}
+
+
+def run_benchmarks(sizes, repeat):
+    results = []
+    for block_cipher_type in BLOCK_CIPHER_TYPES:
+        cipher = kasumi.Kasumi(block_cipher_type=block_cipher_type)
+        key, modified_key = cipher.generate_keys()
+        for size in sizes:
+            message = "a" * size
+            cipher_message = cipher.cipher_message(message, key, modified_key)
+            results.append(measure(f"kasumi_cipher_{block_cipher_type}", size,
+                                   lambda: cipher.cipher_message(message, key, modified_key), repeat))
+            results.append(measure(f"kasumi_decipher_{block_cipher_type}", size,
+                                   lambda: cipher.decipher_message(cipher_message, key, modified_key), repeat))
+        cipher.close()
+
+    for size in sizes:
+        data = bytes(size)
+        results.append(measure("rc4_cipher", size, lambda: rc4.rc4(b"benchmark").cipher(data), repeat))
+        results.append(measure("sponge_hash", size, lambda: sponge_hash(data), repeat))
+    return results
+
+
+"""
+    Returns the results slower than their baseline by more than 'threshold'
+"""
+
+
+def find_regressions(results, baseline_results, threshold):
+    baseline = {(result["name"], result["size"]): result for result in baseline_results}
+    regressions = []
+    for result in results:
+        reference = baseline.get((result["name"], result["size"]))
+        if reference is None:
+            continue
+        if result["mb_per_s"] < reference["mb_per_s"] * (1 - threshold):
+            regressions.append({"name": result["name"],
+                                "size": result["size"],
+                                "mb_per_s": result["mb_per_s"],
+                                "baseline_mb_per_s": reference["mb_per_s"]})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Kasumi, RC4 and sponge hash throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="message sizes in bytes")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="number of timed calls per primitive and size")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="baseline JSON report to compare with")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="tolerated throughput loss against the baseline (0.25 : 25%%)")
+    arguments = parser.parse_args()
+
+    report = {"python": platform.python_version(),
+              "machine": platform.machine(),
+              "results": run_benchmarks(arguments.sizes, arguments.repeat)}
+
+    if arguments.baseline and arguments.save_baseline:
+        with open(arguments.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+    elif arguments.baseline:
+        with open(arguments.baseline, "r") as file:
+            baseline_report = json.load(file)
+        report["threshold"] = arguments.threshold
+        report["regressions"] = find_regressions(report["results"], baseline_report["results"],
+                                                 arguments.threshold)
+
+    json_report = json.dumps(report, indent=2)
+    print(json_report)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(json_report)
+
+    if report.get("regressions"):
+        sys.exit(1)
@@ -1,12 +1,18 @@
 from bitstring import BitArray
 import json
-from copy import copy
+import os
+import tempfile
+from types import MappingProxyType
 
-from signature import El_Gamal_Signature, RSA_Signature, check_El_Gamal_Signature, check_RSA_signature
-from spongeHash import sponge_hash
+from signature import El_Gamal_Signature, RSA_Signature, check_El_Gamal_Signature, check_RSA_signature, \
+    get_RSA_CRT_parameters, check_El_Gamal_Signature_batch, hash_message, hash_messages
+from spongeHash import sponge_hash, sponge_hash_many, SpongeHasher
+from signature_cache import cache_key, verified_signatures
 
 DIFFICULTY = 4
 BLOC_SIZE = 3
+# the highest verified sealed block is stored in '<chain file>_checkpoint'
+CHECKPOINT_FILE_SUFFIX = "_checkpoint"
 
 # returns the blockchain public key by concatenating the signature public keys
 def get_user_public_key(user_public_signature):
@@ -16,43 +22,121 @@ def get_user_public_key(user_public_signature):
         return user_public_signature['n'] + user_public_signature['e']
 
 
+# attributes covered by the signature : they can not be modified once the transaction is signed
+SIGNED_ATTRIBUTES = ('debit_user_public_key', 'credit_user_public_key', 'transaction_value', 'signature')
+
+
 class Transaction:
     def __init__(self, debit_user_public_key, credit_user_public_key,
                  transaction_value: float, signature=None):
+        # cached encodings : unsigned json (signed message), its hash, json with the signature
+        self.unsigned_json = None
+        self.digest = None
+        self.signed_json = None
         self.debit_user_public_key = debit_user_public_key
         self.credit_user_public_key = credit_user_public_key
         self.transaction_value = transaction_value
         self.signature = signature
 
+    # the signed attributes are frozen after signing, the cached encodings stay valid :
+    # the signature is stored as a read only copy, its list values as tuples
+    def __setattr__(self, name, value):
+        if name in SIGNED_ATTRIBUTES:
+            if getattr(self, 'signature', None) is not None:
+                raise AttributeError(f"'{name}' of a signed transaction can not be modified")
+            if name == 'signature':
+                if value is not None:
+                    value = MappingProxyType({key: tuple(item) if isinstance(item, list) else item
+                                              for key, item in value.items()})
+            else:
+                object.__setattr__(self, 'unsigned_json', None)
+                object.__setattr__(self, 'digest', None)
+            object.__setattr__(self, 'signed_json', None)
+        object.__setattr__(self, name, value)
+
+    # returns the signed message : the serialized transaction without its signature
+    def signed_message(self):
+        if self.unsigned_json is None:
+            serialized_transaction = self.serialize()
+            serialized_transaction['signature'] = None
+            object.__setattr__(self, 'unsigned_json', json.dumps(serialized_transaction))
+        return self.unsigned_json
+
+    # returns the hash of the signed message, as signed by El Gamal and RSA
+    def message_digest(self):
+        if self.digest is None:
+            object.__setattr__(self, 'digest', hash_message(self.signed_message()))
+        return self.digest
+
+    # computes the missing message digests of the transactions in lockstep
+    @staticmethod
+    def compute_message_digests(transactions):
+        transactions = [transaction for transaction in transactions if transaction.digest is None]
+        digests = hash_messages([transaction.signed_message() for transaction in transactions])
+        for transaction, digest in zip(transactions, digests):
+            object.__setattr__(transaction, 'digest', digest)
+
+    # returns json.dumps(self.serialize())
+    def to_json(self):
+        if self.signed_json is None:
+            object.__setattr__(self, 'signed_json', json.dumps(self.serialize()))
+        return self.signed_json
+
+    # returns the public key of the signer, None for an unsigned transaction
+    def signer(self):
+        if self.signature is None:
+            return None
+        elif self.signature['signature_type'] == 'El_gamal':
+            return 'El_gamal', self.signature['p'], self.signature['alpha'], self.signature['h']
+        elif self.signature['signature_type'] == 'RSA':
+            return 'RSA', self.signature['e'], self.signature['n']
+        return None
+
+    # returns the key of the signature in the verified signatures cache
+    def cache_key(self):
+        return cache_key(self.signer(), self.message_digest(), self.signature['signature'])
+
+    # verifies the signature, the verified signatures are cached
     def verify(self):
-        transaction_copy = copy(self)
-        transaction_copy.signature = None
-        serialized_copy = transaction_copy.serialize()
+        if self.signer() is None:
+            return False
+        key = self.cache_key()
+        if verified_signatures.contains(key):
+            return True
+        verified = self.check_signature()
+        if verified:
+            verified_signatures.add(key)
+        return verified
+
+    # verifies the signature, without the cache
+    def check_signature(self):
         if self.signature is None:
             return False
         elif self.signature['signature_type'] == 'El_gamal':
             verified = check_El_Gamal_Signature(p=self.signature['p'], signature=self.signature['signature'],
-                                            message=json.dumps(serialized_copy), alpha=self.signature['alpha'],
+                                            digest=self.message_digest(), alpha=self.signature['alpha'],
                                             h=self.signature['h'])
             if not verified:
                 print("signature not verified")
             return verified
         elif self.signature['signature_type'] == 'RSA':
             verified = check_RSA_signature(e=self.signature['e'], n=self.signature['n'],
-                                       signature=self.signature['signature'], message=json.dumps(serialized_copy))
+                                       signature=self.signature['signature'], digest=self.message_digest())
             if not verified:
                 print("signature not verified")
             return verified
         return False
 
     # returns the signature and generates it if necessary
-    def sign(self, debit_user_private_signature, signature_type='El_gamal'):
+    # (El Gamal nonces are taken from 'nonce_pool' when given)
+    def sign(self, debit_user_private_signature, signature_type='El_gamal', nonce_pool=None):
         if self.signature is None:
             if signature_type == 'El_gamal':
                 p, alpha, h, x = debit_user_private_signature['p'], debit_user_private_signature['alpha'], \
                                  debit_user_private_signature['h'], debit_user_private_signature['x']
                 self.signature = {'signature': El_Gamal_Signature(p=p, x=x, h=h, alpha=alpha,
-                                                                  message=json.dumps(self.serialize())),
+                                                                  digest=self.message_digest(),
+                                                                  nonce_pool=nonce_pool),
                                   'signature_type': signature_type,
                                   'p': p,
                                   'alpha': alpha,
@@ -62,7 +146,8 @@ class Transaction:
                 n, e, d = debit_user_private_signature['n'], debit_user_private_signature['e'], \
                           debit_user_private_signature['d']
                 self.signature = {'signature': RSA_Signature(n=n, d=d,
-                                                             message=json.dumps(self.serialize())),
+                                                             digest=self.message_digest(),
+                                                             crt=get_RSA_CRT_parameters(debit_user_private_signature)),
                                   'signature_type': signature_type,
                                   'e': e,
                                   'n': n}
@@ -75,7 +160,7 @@ class Transaction:
             'debit_user_public_key': self.debit_user_public_key,
             'credit_user_public_key': self.credit_user_public_key,
             'transaction_value': self.transaction_value,
-            'signature': self.signature,
+            'signature': None if self.signature is None else dict(self.signature),
         }
 
     @staticmethod
@@ -86,6 +171,54 @@ class Transaction:
                            data['signature'])
 
 
+"""
+    Verifies the signatures of the transactions, returns the result of each one :
+        : the signatures of the verified signatures cache are not checked again,
+            only the signatures checked one by one or by a passing (sound)
+            batch test are recorded
+        : the El Gamal transactions are grouped by signer public key,
+            each group is checked at once by a batch test
+        : the RSA transactions, and those of a failed group, are checked
+            one by one (a batch test of RSA signatures does not notice
+            signatures s' = n - s going by pairs)
+"""
+
+
+def verify_batch(transactions):
+    Transaction.compute_message_digests([transaction for transaction in transactions
+                                         if transaction.signer() is not None])
+    results = [False] * len(transactions)
+    keys = [None] * len(transactions)
+    groups = {}
+    for index, transaction in enumerate(transactions):
+        signer = transaction.signer()
+        if signer is None:
+            continue
+        keys[index] = transaction.cache_key()
+        if verified_signatures.contains(keys[index]):
+            results[index] = True
+        else:
+            groups.setdefault(signer, []).append(index)
+
+    for signer, indexes in groups.items():
+        if len(indexes) > 1 and signer[0] == 'El_gamal':
+            _, p, alpha, h = signer
+            signatures = [transactions[index].signature['signature'] for index in indexes]
+            digests = [transactions[index].message_digest() for index in indexes]
+            if check_El_Gamal_Signature_batch(p, alpha, h, signatures, digests=digests):
+                for index in indexes:
+                    results[index] = True
+                    verified_signatures.add(keys[index])
+                continue
+
+        # single transaction, RSA or failed batch : find the faulty transactions
+        for index in indexes:
+            results[index] = transactions[index].check_signature()
+            if results[index]:
+                verified_signatures.add(keys[index])
+    return results
+
+
 class Block:
     def __init__(self, block_number: int, previous_hash: str):
         self.transactions = []
@@ -114,26 +247,54 @@ class Block:
         return block
 
     # Returns the computed block's hash
-    def hash(self):
-        return BitArray(bytes=sponge_hash(json.dumps(self.serialize()).encode()))
+    # (from the midstate of 'salt_prefix_hasher' when given, only the salt is absorbed then)
+    def hash(self, salt_prefix_hasher=None):
+        if salt_prefix_hasher is None:
+            return BitArray(bytes=sponge_hash(self.to_json().encode()))
+        hasher = salt_prefix_hasher.copy()
+        hasher.update((json.dumps(self.salt) + '}').encode())
+        return BitArray(bytes=hasher.digest())
+
+    # Returns a hasher that absorbed the serialized block up to its salt, the last serialized key
+    def salt_prefix_hasher(self):
+        return SpongeHasher(self.json_prefix().encode())
+
+    # Returns json.dumps(self.serialize()), the transactions are not encoded again
+    def to_json(self):
+        return self.json_prefix() + json.dumps(self.salt) + '}'
+
+    # Returns the serialized block up to its salt, the last serialized key
+    def json_prefix(self):
+        transactions = ', '.join(transaction.to_json() for transaction in self.transactions)
+        return f'{{"transactions": [{transactions}], "number": {json.dumps(self.number)}, ' \
+               f'"previous_hash": {json.dumps(self.previous_hash)}, "salt": '
 
     # [0] returns true if the block's hash fits the difficult
     # [1] returns the computed hash
-    def verify_salt(self):
+    def verify_salt(self, salt_prefix_hasher=None, computed_hash=None):
+        if computed_hash is None:
+            computed_hash = self.hash(salt_prefix_hasher)
+        return Block.fits_difficulty(computed_hash), computed_hash.hex
+
+    # returns true if the given hash ends with DIFFICULTY zero bits
+    @staticmethod
+    def fits_difficulty(computed_hash):
         pattern_to_match = "0" * DIFFICULTY
-        computed_hash = self.hash()
-        verified = (computed_hash[-DIFFICULTY:].bin == pattern_to_match)
-        return verified, computed_hash.hex
+        return computed_hash[-DIFFICULTY:].bin == pattern_to_match
 
-    # Verifies the block integrity regarding its salt and previous block hash
-    def verify(self, previous_hash, signature_type, is_last):
+    # Verifies the block integrity regarding its transactions signatures, salt and previous block hash
+    # ('computed_hash' is the block's hash when already known,
+    # 'signatures_verified' the verify_batch results of its transactions)
+    def verify(self, previous_hash, signature_type, is_last, computed_hash=None, signatures_verified=None):
+        if signatures_verified is None:
+            signatures_verified = verify_batch(self.transactions)
         transactions_verified = True
         previous_hash_matching = (previous_hash == self.previous_hash)
-        for transaction in self.transactions:
+        for transaction, signature_verified in zip(self.transactions, signatures_verified):
             corresponding_signature_type = (transaction.signature['signature_type'] == signature_type)
             if not corresponding_signature_type:
                 print('not corresponding transaction signature type')
-            transactions_verified = transactions_verified and transaction.verify() \
+            transactions_verified = transactions_verified and signature_verified \
                                     and corresponding_signature_type
             if not transactions_verified:
                 print('Faulty transaction : ' + json.dumps(transaction.serialize()))
@@ -141,21 +302,23 @@ class Block:
         if not previous_hash_matching:
             print('hashs not corresponding: ' + str(previous_hash) + ' != ' + str('self.previous_hash'))
         if not is_last:
-            verified_salt, hash = self.verify_salt()
+            verified_salt, hash = self.verify_salt(computed_hash=computed_hash)
             if not verified_salt:
                 print('salt verification failed')
-            return previous_hash_matching and verified_salt
+            return transactions_verified and previous_hash_matching and verified_salt
         else:
-            return previous_hash_matching
+            return transactions_verified and previous_hash_matching
 
     # Computes the salt matching the required difficulty
+    # (each salt is hashed from the midstate of the block serialized up to its salt)
     def mine(self):
         i = 0
-        verified, computed_hash = self.verify_salt()
+        salt_prefix_hasher = self.salt_prefix_hasher()
+        verified, computed_hash = self.verify_salt(salt_prefix_hasher)
         while not verified:
             self.salt = i
             print("mining... try " + str(i))
-            verified, computed_hash = self.verify_salt()
+            verified, computed_hash = self.verify_salt(salt_prefix_hasher)
             i += 1
         print('block ' + str(self.number) + ' mined with salt ' + str(self.salt) + ' and hash ' + computed_hash)
         return computed_hash
@@ -165,6 +328,8 @@ class Blockchain:
     def __init__(self, signature_type='El_gamal'):
         self.chain = []
         self.signature_type = signature_type
+        # file the chain was loaded from or saved to, the checkpoint is stored next to it
+        self.file_path = None
 
     # Mines the existing block and creates a new one
     def increment(self):
@@ -192,10 +357,12 @@ class Blockchain:
         self.chain.append(new_block)
 
     # Saves the blockchain on the given file path
+    # (same content as json.dump of the serialized blocks, built from their cached encodings)
     def save(self, saving_file_path: str):
         with open(saving_file_path, "w") as write_file:
-            json.dump({'chain': [b.serialize() for b in self.chain],
-                       'signature_type': self.signature_type}, fp=write_file)
+            write_file.write('{"chain": [' + ', '.join(b.to_json() for b in self.chain) +
+                             '], "signature_type": ' + json.dumps(self.signature_type) + '}')
+        self.file_path = saving_file_path
 
     # Returns a blockchain object from the given file path
     @staticmethod
@@ -206,19 +373,76 @@ class Blockchain:
             blockchain = Blockchain(loaded_data['signature_type'])
             for b in chain:
                 blockchain.add_block(Block.deserialize(b))
+        blockchain.file_path = file_path
         return blockchain
 
-    # Verifies the integrity of the whole chain
-    def verify(self):
-        verified = True
+    # Returns the hashes of the blocks from 'start', computed in lockstep
+    def hashes(self, start=0):
+        serialized_blocks = [block.to_json().encode() for block in self.chain[start:]]
+        return [BitArray(bytes=block_hash) for block_hash in sponge_hash_many(serialized_blocks)]
+
+    # Returns the path of the checkpoint file, None if the chain has no file
+    def checkpoint_path(self):
+        if self.file_path is None:
+            return None
+        return self.file_path + CHECKPOINT_FILE_SUFFIX
+
+    # Returns the (number, hash) of the highest verified sealed block, None without valid checkpoint
+    def load_checkpoint(self):
+        if self.checkpoint_path() is None:
+            return None
+        try:
+            with open(self.checkpoint_path(), 'r') as read_file:
+                checkpoint = json.load(read_file)
+            return int(checkpoint['number']), str(checkpoint['hash'])
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+
+    # Records the highest verified sealed block
+    def save_checkpoint(self, number, block_hash):
+        if self.checkpoint_path() is None:
+            return
+        # unique temporary file : the concurrent verifications of the server never write the same file
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(self.checkpoint_path())),
+                                         prefix=os.path.basename(self.checkpoint_path()) + '.',
+                                         delete=False) as write_file:
+            json.dump({'number': number, 'hash': block_hash}, fp=write_file)
+        os.replace(write_file.name, self.checkpoint_path())
+
+    # Verifies the integrity of the chain
+    # (the signatures of all the transactions are checked together, see verify_batch)
+    #   : full=False : only the blocks after the checkpoint are verified, once the
+    #       checkpoint block still has the recorded hash
+    #   : full=True : the whole chain is verified
+    def verify(self, full=False):
+        start = 0
         previous_hash = self.chain[0].previous_hash
-        for block in self.chain:
+        checkpoint = None if full else self.load_checkpoint()
+        # the checkpoint block must be sealed : the last block still receives transactions
+        if checkpoint is not None and 0 <= checkpoint[0] < len(self.chain) - 1:
+            number, checkpoint_hash = checkpoint
+            if self.chain[number].hash().hex == checkpoint_hash:
+                start = number + 1
+                previous_hash = checkpoint_hash
+            else:
+                print('checkpoint hash not matching, verifying the whole chain')
+
+        verified = True
+        signatures_verified = iter(verify_batch([transaction for block in self.chain[start:]
+                                                 for transaction in block.transactions]))
+        for block, block_hash in zip(self.chain[start:], self.hashes(start)):
             is_last = (block.number == len(self.chain) - 1)
-            verified = verified and block.verify(previous_hash, self.signature_type, is_last)
-            previous_hash = block.hash().hex
+            block_signatures_verified = [next(signatures_verified) for _ in block.transactions]
+            verified = verified and block.verify(previous_hash, self.signature_type, is_last, block_hash,
+                                                 block_signatures_verified)
+            previous_hash = block_hash.hex
             if not verified:
                 print('Chain rupture here: block ' + str(block.number))
                 break
+
+        # the last sealed block hash is the previous hash of the last block
+        if verified and len(self.chain) >= 2:
+            self.save_checkpoint(len(self.chain) - 2, self.chain[-1].previous_hash)
         return verified
 
     # computes the account balance for a given public key
@@ -10,6 +10,9 @@ import base64
 import blockchain
 import signature
 import kasumi
+import modexp
+import nonce_pool
+import prime_pool
 import tools
 from blockchain import Transaction
 
@@ -56,6 +59,8 @@ class ClientThread(Thread):
         self.signature_type = signature_type
         self.signature_dict = {}
         self.receiver_signature_dict = {}
+        # precomputed El Gamal nonces of the private key
+        self.nonce_pool = None
 
         self.kasumi = kasumi.Kasumi(block_cipher_type="PCBC")
 
@@ -94,25 +99,44 @@ class ClientThread(Thread):
     """
 
     def check_prime_number_files(self):
+        missing_files = []
         for i in range(1, 3):
             try:
                 # if there is a file OK
                 with open(f"{self.client_name}_safe_512_prime_{i}", "r") as file:
                     pass
-            # if not : find a prime number
+            # if not : take a prime number from the pool, or find one
             except FileNotFoundError:
-                print("*** generating a safe prime number, may takes time ***")
-                p = tools.find_safe_512_bits_prime()
-                # save it to a file
-                with open(f"{self.client_name}_safe_512_prime_{i}", "w") as file:
+                if not prime_pool.claim_safe_prime(f"{self.client_name}_safe_512_prime_{i}"):
+                    missing_files.append(f"{self.client_name}_safe_512_prime_{i}")
+
+        if missing_files:
+            print("*** generating safe prime numbers, may takes time ***")
+            safe_primes = tools.find_safe_512_bits_primes_parallel(
+                len(missing_files), progress_callback=self.print_safe_prime_progress)
+            print()
+            # save them to files
+            for file_name, p in zip(missing_files, safe_primes):
+                with open(file_name, "w") as file:
                     file.write(str(p))
 
+    # fixed base table of the generator of the first safe prime
+    def fixed_base_table_file(self):
+        return f"{self.client_name}_safe_512_prime_1_table"
+
+    def print_safe_prime_progress(self, safe_primes_found, windows_searched):
+        print(f"\r*** {safe_primes_found} safe prime(s) found, "
+              f"{windows_searched} candidate windows searched ***", end='')
+
     def load_private_key_file(self):
         try:
             # if there is a file load signature
             with open(f"{self.client_name}_private_key", "r") as file:
                 self.signature_dict = json.load(file)
-                pass
+            if "alpha" in self.signature_dict:
+                modexp.fixed_base_table(self.signature_dict["alpha"], self.signature_dict["p"],
+                                        self.fixed_base_table_file())
+                self.nonce_pool = nonce_pool.get_nonce_pool(self.signature_dict["p"], self.signature_dict["alpha"])
         # if not : generates the key
         except FileNotFoundError:
             # save it to a file
@@ -191,6 +215,8 @@ class ClientThread(Thread):
                 self.receiver_signature_dict["p"] = message["p"]
                 self.receiver_signature_dict["alpha"] = message["alpha"]
                 self.receiver_signature_dict["h"] = message["h"]
+                # every message of the receiver is checked with this alpha
+                modexp.fixed_base_table(message["alpha"], message["p"])
                 # reçoit signature du receiver, mais générere la sienne
                 # qui si on en a pas encore*
                 if self.signature_dict == {}:
@@ -233,10 +259,9 @@ class ClientThread(Thread):
     def init_secret_key(self):
         print("*** generating secret key with diffie Hellman ***")
 
-        with open(self.client_name + "_safe_512_prime_1", "r") as file:
-            p = int(file.read())
+        p = tools.load_safe_prime(self.client_name + "_safe_512_prime_1")
 
-        p, alpha, A, r = signature.diffie_hellman_step_1(p)
+        p, alpha, A, r = signature.diffie_hellman_step_1(p, table_file=self.fixed_base_table_file())
 
         self.DH_dict["p"] = p
         self.DH_dict["alpha"] = alpha
@@ -262,30 +287,34 @@ class ClientThread(Thread):
         if self.signature_type == "RSA":
             print("*** Initialazing RSA signature ***")
 
-            with open(f"{self.client_name}_safe_512_prime_1", "r") as file:
-                p = int(file.read())
+            p = tools.load_safe_prime(f"{self.client_name}_safe_512_prime_1")
 
-            with open(f"{self.client_name}_safe_512_prime_2", "r") as file:
-                q = int(file.read())
+            q = tools.load_safe_prime(f"{self.client_name}_safe_512_prime_2")
 
-            n, e, d = signature.init_RSA_Signature(p, q)
+            n, e, d = signature.init_RSA_Signature(p, q, public_exponent=signature.RSA_PUBLIC_EXPONENT)
+            d_p, d_q, q_inv = signature.init_RSA_CRT_parameters(p, q, d)
 
             self.signature_dict["n"] = n
             self.signature_dict["e"] = e
             self.signature_dict["d"] = d
+            self.signature_dict["p"] = p
+            self.signature_dict["q"] = q
+            self.signature_dict["dP"] = d_p
+            self.signature_dict["dQ"] = d_q
+            self.signature_dict["qInv"] = q_inv
 
         if self.signature_type == "El_gamal":
             print("*** Initialazing El Gamal signature ***")
 
-            with open(f"{self.client_name}_safe_512_prime_1", "r") as file:
-                p = int(file.read())
+            p = tools.load_safe_prime(f"{self.client_name}_safe_512_prime_1")
 
-            p, alpha, h, x = signature.init_El_Gamal_Signature(p)
+            p, alpha, h, x = signature.init_El_Gamal_Signature(p, table_file=self.fixed_base_table_file())
 
             self.signature_dict["p"] = p
             self.signature_dict["alpha"] = alpha
             self.signature_dict["h"] = h
             self.signature_dict["x"] = x
+            self.nonce_pool = nonce_pool.get_nonce_pool(p, alpha)
 
     # Kasumi cipher of a whole message
     def cipher_message(self, message):
@@ -312,13 +341,15 @@ class ClientThread(Thread):
                 self.signature_dict["alpha"],
                 self.signature_dict["h"],
                 self.signature_dict["x"],
-                message=message
+                message=message,
+                nonce_pool=self.nonce_pool
             )
         if self.signature_type == "RSA":
             signature_message = signature.RSA_Signature(
                 self.signature_dict["n"],
                 self.signature_dict["d"],
-                message=message
+                message=message,
+                crt=signature.get_RSA_CRT_parameters(self.signature_dict)
             )
         return signature_message
 
@@ -330,7 +361,7 @@ class ClientThread(Thread):
                                       credit_user_public_key=blockchain.get_user_public_key(
                                           self.receiver_signature_dict),
                                       transaction_value=amount)
-        new_transaction.sign(self.signature_dict, self.signature_type)
+        new_transaction.sign(self.signature_dict, self.signature_type, nonce_pool=self.nonce_pool)
         return new_transaction.serialize()
 
     """
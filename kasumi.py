@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 
+import array
+import mmap
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
 import rc4
-import pyfinite.ffield
 
 """
     This module provides the implementation
@@ -12,6 +20,7 @@ import pyfinite.ffield
         : RC4 PRNG generating S_Boxes, and the secret
         : iterated block cipher :
             : ECB, CBC, PCBC, CTR
+        : numpy batched and process pool parallel block modes
 """
 
 
@@ -20,22 +29,330 @@ KEY_BIT_SIZE = 128
 NOTHING_UP_NUMBER = 0x123456789ABCDEFFEDCBA9876543210
 
 GALOIS_FIELD_SIZE = 16
+# x^16 + x^5 + x^3 + x^2 + 1, default GF(2^16) generator of pyfinite
+GALOIS_FIELD_POLYNOMIAL = 0x1002D
+GALOIS_INVERSE_TABLE_FILE = "gf_16_inverse_table"
 
 RC4_INPUT_KEY = 'LucienD&IreneeD'
 INITIALIZATION_NUMBER = int.from_bytes(b"ABCDEFGH", "little")
 
+# size of the chunks read by the stream ciphers
+STREAM_CHUNK_SIZE = 1 << 16
+
+# from this number of blocks, the parallelisable block modes run on numpy arrays
+BATCH_MIN_BLOCKS = 24
+
+# from this input size, the parallelisable block modes are split between processes
+PARALLEL_MIN_BYTES = 4 << 20
+# number of blocks ciphered by a worker process at once
+PARALLEL_SEGMENT_BLOCKS = 1 << 17
+
+
+"""
+    Galois Field (GF_16) inversion table, inverse[0] is 0
+
+        > x generates the multiplicative group, the inverse of x^i is x^-i
+"""
+
+
+def build_galois_inverse_table():
+    field_size = 1 << GALOIS_FIELD_SIZE
+    group_order = field_size - 1
+    powers = array.array('H', bytes(2 * group_order))
+
+    power = 1
+    for i in range(group_order):
+        powers[i] = power
+        power = power << 1
+        if power & field_size:
+            power = power ^ GALOIS_FIELD_POLYNOMIAL
+
+    inverse = array.array('H', bytes(2 * field_size))
+    for i in range(group_order):
+        inverse[powers[i]] = powers[-i % group_order]
+    return inverse
+
+
+galois_inverse_table = None
+
+"""
+    Returns the GF_16 inversion table, memory mapped from 'file_name'
+    (the file is created on first use, in native byte order)
+"""
+
+
+def load_galois_inverse_table(file_name=GALOIS_INVERSE_TABLE_FILE):
+    global galois_inverse_table
+    if galois_inverse_table is not None:
+        return galois_inverse_table
+
+    table_size = 2 << GALOIS_FIELD_SIZE
+    if not os.path.isfile(file_name) or os.path.getsize(file_name) != table_size:
+        temporary_file_name = f"{file_name}.{os.getpid()}.tmp"
+        with open(temporary_file_name, "wb") as file:
+            file.write(build_galois_inverse_table().tobytes())
+        os.replace(temporary_file_name, file_name)
+
+    with open(file_name, "rb") as file:
+        table_map = mmap.mmap(file.fileno(), table_size, access=mmap.ACCESS_READ)
+    galois_inverse_table = memoryview(table_map).cast('H')
+    return galois_inverse_table
+
+
+"""
+    Batched kasumi feistel cipher : the blocks are an uint64 numpy array,
+    the FL, FO and FI functions run over all of them with table gathers
+        : rounds : KasumiKeySchedule.rounds
+        : s_box_16, galois_inverse : uint32 numpy tables
+"""
+
+
+def left_shift_many(x):
+    return ((x & 0x7FFF) << 1) | (x >> 15)
+
+
+def FL_many(x, round_keys, galois_inverse):
+    l = x & 0xFFFF  # LSB
+    r = x >> 16  # MSB
+
+    r_dash = left_shift_many(l & round_keys[0]) ^ r
+    l_dash = left_shift_many(r_dash | round_keys[1]) ^ l
+
+    return galois_inverse[r_dash] | galois_inverse[l_dash] << 16
+
+
+def FO_many(x, round_keys, s_box_16):
+    l = x & 0xFFFF  # LSB
+    r = x >> 16  # MSB
+
+    for j in range(3):
+        KI = round_keys[5+j]
+        # FI(KI, z) : 8 bits right shift of KI xored with the S_boxes output
+        l, r = r, s_box_16[l ^ round_keys[2+j]] ^ ((KI >> 2) | ((KI & 3) << 6)) ^ r
+
+    return l | r << 16
+
+
+def feistel_encryption_many(blocks, rounds, s_box_16, galois_inverse):
+    L = (blocks & np.uint64(0xFFFFFFFF)).astype(np.uint32)  # LSB
+    R = (blocks >> np.uint64(32)).astype(np.uint32)  # MSB
+
+    for iteration, round_keys in enumerate(rounds):
+        # even
+        if iteration % 2 == 0:
+            new_L = FO_many(FL_many(L, round_keys, galois_inverse), round_keys, s_box_16) ^ R
+        # odd
+        else:
+            new_L = FL_many(FO_many(L, round_keys, s_box_16), round_keys, galois_inverse) ^ R
+        R = L
+        L = new_L
+
+    return L.astype(np.uint64) | R.astype(np.uint64) << np.uint64(32)
+
+
+def feistel_decryption_many(blocks, rounds, s_box_16, galois_inverse):
+    L = (blocks & np.uint64(0xFFFFFFFF)).astype(np.uint32)  # LSB
+    R = (blocks >> np.uint64(32)).astype(np.uint32)  # MSB
+
+    for iteration in reversed(range(0, 8)):
+        round_keys = rounds[iteration]
+        new_L = R
+        # even
+        if iteration % 2 == 0:
+            R = FO_many(FL_many(R, round_keys, galois_inverse), round_keys, s_box_16) ^ L
+        # odd
+        else:
+            R = FL_many(FO_many(R, round_keys, s_box_16), round_keys, galois_inverse) ^ L
+        L = new_L
+
+    return L.astype(np.uint64) | R.astype(np.uint64) << np.uint64(32)
+
+
+# returns the 'num_blocks' first blocks of the bytes 'data' as an uint64 array
+def blocks_array(data, num_blocks):
+    return np.frombuffer(data, dtype="<u8", count=num_blocks).astype(np.uint64)
+
+
+# writes the uint64 array 'blocks' at the beginning of the writable buffer 'output'
+def store_blocks(blocks, output):
+    np.frombuffer(output, dtype="<u8", count=len(blocks))[:] = blocks
+
+
+# reads from 'reader' until 'chunk' is full or the stream ends, returns the number of bytes read
+def read_chunk(reader, chunk):
+    filled = 0
+    while filled < len(chunk):
+        read = reader.readinto(chunk[filled:])
+        if not read:
+            break
+        filled = filled + read
+    return filled
+
+
+"""
+    Process pool parallel kasumi : the workers get the tables and the round keys
+    from a shared memory block, and read / write the blocks in two others
+        : tables block : s_box_16 | galois_inverse | 8 x 8 round keys, as uint32
+"""
+
+TABLE_SIZE = 1 << 16
+SHARED_TABLES_SIZE = 2 * TABLE_SIZE + 64
+
+
+def create_shared_tables(s_box_16, galois_inverse, rounds):
+    shared_block = shared_memory.SharedMemory(create=True, size=SHARED_TABLES_SIZE * 4)
+    tables = np.ndarray((SHARED_TABLES_SIZE,), dtype=np.uint32, buffer=shared_block.buf)
+    tables[:TABLE_SIZE] = s_box_16
+    tables[TABLE_SIZE:2 * TABLE_SIZE] = galois_inverse
+    tables[2 * TABLE_SIZE:] = [sub_key for round_keys in rounds for sub_key in round_keys[:8]]
+    del tables
+    return shared_block
+
+
+# attaches an existing shared memory block, its creator is in charge of unlinking it
+# (the worker processes share the resource tracker of their parent)
+def attach_shared_memory(name):
+    return shared_memory.SharedMemory(name=name)
+
+
+# worker side cache of the attached tables : name -> (shared block, s_box_16, galois_inverse, rounds)
+worker_shared_tables = {}
+
+
+def load_shared_tables(name):
+    if name not in worker_shared_tables:
+        if len(worker_shared_tables) >= 8:
+            worker_shared_tables.clear()
+        shared_block = attach_shared_memory(name)
+        tables = np.ndarray((SHARED_TABLES_SIZE,), dtype=np.uint32, buffer=shared_block.buf)
+        round_keys = tables[2 * TABLE_SIZE:].tolist()
+        rounds = tuple(tuple(round_keys[8*i: 8*(i+1)]) for i in range(8))
+        worker_shared_tables[name] = (shared_block, tables[:TABLE_SIZE], tables[TABLE_SIZE:2 * TABLE_SIZE], rounds)
+    return worker_shared_tables[name][1:]
+
+
+"""
+    Worker process job : ciphers 'num_blocks' blocks from 'first_block'
+        : operation :
+            : encrypt, decrypt : ECB
+            : counter : CTR, 'vect' is the counter of the first input block
+            : chained_decrypt : D(C_i) ^ C_i-1 (CBC, and PCBC before the cumulative xor),
+                'vect' is the block before the first input block
+"""
+
+
+def parallel_blocks_worker(tables_name, input_name, output_name, first_block, num_blocks, operation, vect):
+    s_box_16, galois_inverse, rounds = load_shared_tables(tables_name)
+    input_block = attach_shared_memory(input_name)
+    output_block = attach_shared_memory(output_name)
+    try:
+        input_blocks = np.ndarray((num_blocks,), dtype="<u8", buffer=input_block.buf,
+                                  offset=first_block * BLOC_SIZE_BYTES)
+        output_blocks = np.ndarray((num_blocks,), dtype="<u8", buffer=output_block.buf,
+                                   offset=first_block * BLOC_SIZE_BYTES)
+        blocks = input_blocks.astype(np.uint64)
+
+        if operation == "encrypt":
+            output_blocks[:] = feistel_encryption_many(blocks, rounds, s_box_16, galois_inverse)
+
+        if operation == "decrypt":
+            output_blocks[:] = feistel_decryption_many(blocks, rounds, s_box_16, galois_inverse)
+
+        if operation == "counter":
+            counters = np.arange(vect + first_block, vect + first_block + num_blocks, dtype=np.uint64)
+            output_blocks[:] = blocks ^ feistel_encryption_many(counters, rounds, s_box_16, galois_inverse)
+
+        if operation == "chained_decrypt":
+            if first_block > 0:
+                vect = int(np.ndarray((1,), dtype="<u8", buffer=input_block.buf,
+                                      offset=(first_block - 1) * BLOC_SIZE_BYTES)[0])
+            previous_blocks = np.concatenate((np.array([vect], dtype=np.uint64), blocks[:-1]))
+            output_blocks[:] = feistel_decryption_many(blocks, rounds, s_box_16, galois_inverse) ^ previous_blocks
+
+        # the numpy views must be released before closing the blocks
+        del input_blocks, output_blocks
+    finally:
+        input_block.close()
+        output_block.close()
+
+
+def close_parallel_resources(parallel_resources):
+    if parallel_resources["pool"] is not None:
+        parallel_resources["pool"].shutdown()
+        parallel_resources["pool"] = None
+    for shared_block in parallel_resources["shared_tables"].values():
+        shared_block.close()
+        shared_block.unlink()
+    parallel_resources["shared_tables"].clear()
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+"""
+    Kasumi key schedule of a session key (key, modified_key)
+        : rounds : for each of the 8 rounds, the sub keys tuple (see Kasumi.generate_sub_key)
+            followed by the (table, constant) pair of each KI sub key (see Kasumi.fi_table)
+"""
+
+
+class KasumiKeySchedule():
+    def __init__(self, kasumi, key, modified_key):
+        self.key = key
+        self.modified_key = modified_key
+        rounds = []
+        for iteration in range(8):
+            round_keys = kasumi.generate_sub_key(key, modified_key, iteration)
+            for KI in round_keys[5:]:
+                round_keys = round_keys + kasumi.fi_table(KI)
+            rounds.append(round_keys)
+        self.rounds = tuple(rounds)
+
+
+"""
+    Fused 16 bits S_box : the two 8 bits S_boxes applied to the LSB and the MSB of z
+"""
+
+
+def build_s_box_16(s_box_1, s_box_2):
+    return [s_box_1[z & 0xFF] | s_box_2[z >> 8] << 8 for z in range(1 << 16)]
+
 
 class Kasumi():
     def __init__(self, block_cipher_type="PCBC",
                  rc4_input_key='LucienD&IreneeD)',
-                 initialization_numbe_bytes=b"ABCDEFGH"):
+                 initialization_numbe_bytes=b"ABCDEFGH",
+                 combined_fi_tables=False,
+                 parallel_workers=1):
 
         self.block_cipher_type = block_cipher_type
         self.rc4_prng = rc4.rc4(rc4_input_key.encode())
         self.initialization_number = int.from_bytes(initialization_numbe_bytes, "little")
         self.s_box_1 = self.rc4_prng.get_bytes(256)
         self.s_box_2 = self.rc4_prng.get_bytes(256)
-        self.galois_field = pyfinite.ffield.FField(GALOIS_FIELD_SIZE)
+        self.s_box_16 = build_s_box_16(self.s_box_1, self.s_box_2)
+        # one FI table per KI sub key (24 tables of 128 KiB per session key)
+        self.combined_fi_tables = combined_fi_tables
+        self.galois_inverse = load_galois_inverse_table()
+        self.s_box_16_array = np.array(self.s_box_16, dtype=np.uint32)
+        self.galois_inverse_array = np.asarray(self.galois_inverse).astype(np.uint32)
+        self.key_schedules = {}
+
+        # process pool and shared tables, created with the first large input
+        # (serial by default, available_cpus() workers to use every CPU)
+        self.parallel_workers = parallel_workers
+        self.parallel_resources = {"pool": None, "shared_tables": {}}
+        weakref.finalize(self, close_parallel_resources, self.parallel_resources)
+
+    """
+        Shuts the worker processes down and frees the shared tables
+    """
+
+    def close(self):
+        close_parallel_resources(self.parallel_resources)
 
     """
         génère clé avec RC4 ou prend une sous clé de la input_key
@@ -66,24 +383,33 @@ class Kasumi():
         return key
 
     """
-        Generate the 8 sub keys
+        Generate the 8 sub keys of a round
+            : (KL_i_1, KL_i_2, KO_i_1, KO_i_2, KO_i_3, KI_i_1, KI_i_2, KI_i_3)
     """
 
     def generate_sub_key(self, key, modified_key, iteration):
-        keys_dict = {}
+        return (self.left_shift(self.take_sub_key(key, iteration), 1, 16),
+                self.take_sub_key(modified_key, (iteration+2) % 8),
 
-        keys_dict["KL_i_1"] = self.left_shift(self.take_sub_key(key, iteration), 1, 16)
-        keys_dict["KL_i_2"] = self.take_sub_key(modified_key, (iteration+2) % 8)
+                self.left_shift(self.take_sub_key(key, (iteration+1) % 8), 5),
+                self.left_shift(self.take_sub_key(key, (iteration+5) % 8), 8),
+                self.left_shift(self.take_sub_key(key, (iteration+6) % 8), 13),
 
-        keys_dict["KO_i_1"] = self.left_shift(self.take_sub_key(key, (iteration+1) % 8), 5)
-        keys_dict["KO_i_2"] = self.left_shift(self.take_sub_key(key, (iteration+5) % 8), 8)
-        keys_dict["KO_i_3"] = self.left_shift(self.take_sub_key(key, (iteration+6) % 8), 13)
+                self.take_sub_key(modified_key, (iteration+4) % 8),
+                self.take_sub_key(modified_key, (iteration+3) % 8),
+                self.take_sub_key(modified_key, (iteration+7) % 8))
 
-        keys_dict["KI_i_1"] = self.take_sub_key(modified_key, (iteration+4) % 8)
-        keys_dict["KI_i_2"] = self.take_sub_key(modified_key, (iteration+3) % 8)
-        keys_dict["KI_i_3"] = self.take_sub_key(modified_key, (iteration+7) % 8)
+    """
+        Returns the key schedule of the session key (key, modified_key),
+        computed on first use then cached
+    """
 
-        return keys_dict
+    def key_schedule(self, key, modified_key):
+        key_schedule = self.key_schedules.get((key, modified_key))
+        if key_schedule is None:
+            key_schedule = KasumiKeySchedule(self, key, modified_key)
+            self.key_schedules[(key, modified_key)] = key_schedule
+        return key_schedule
 
     """
         circual bitwise right shift
@@ -124,268 +450,417 @@ class Kasumi():
     """
 
     def FI(self, y, z):
-        z_bytes = z.to_bytes(2, "little")
-        z_1 = z_bytes[0]  # LSB
-        z_2 = z_bytes[1]  # MSB
-
-        z_1 = self.s_box_1[z_1]
-        z_2 = self.s_box_2[z_2]
+        return self.right_shift(y, 2, nb_bits=8) ^ self.s_box_16[z]
 
-        z = z_1.to_bytes(1, "little") + z_2.to_bytes(1, "little")
-        z = int.from_bytes(z, "little")
+    """
+        Returns (table, constant) such as FI(y, z) == table[z] ^ constant
+        for the fixed sub key y, the constant is folded in the table
+        when combined FI tables are used
+    """
 
-        x = self.right_shift(y, 2, nb_bits=8) ^ (z)
-        return x
+    def fi_table(self, y):
+        constant = self.right_shift(y, 2, nb_bits=8)
+        if self.combined_fi_tables:
+            return array.array('H', [constant ^ s_box_value for s_box_value in self.s_box_16]), 0
+        return self.s_box_16, constant
 
     """
         kasumi FL function with Galois inversion modification
     """
 
-    def FL(self, x, keys_dict):
-        x_bytes = x.to_bytes(4, "little")
+    def FL(self, x, round_keys):
+        l = x & 0xFFFF  # LSB
+        r = x >> 16  # MSB
 
-        l = x_bytes[:2]  # LSB
-        r = x_bytes[2:]  # MSB
+        r_dash = self.left_shift(l & round_keys[0], 1) ^ r
+        l_dash = self.left_shift(r_dash | round_keys[1], 1) ^ l
 
-        l = int.from_bytes(l, "little")
-        r = int.from_bytes(r, "little")
+        return self.galois_inverse[r_dash] | self.galois_inverse[l_dash] << 16
 
-        r_dash = self.left_shift(l & keys_dict["KL_i_1"], 1) ^ r
-        l_dash = self.left_shift(r_dash | keys_dict["KL_i_2"], 1) ^ l
+    def FO(self, x, round_keys):
+        l = x & 0xFFFF  # LSB
+        r = x >> 16  # MSB
 
-        r_dash_inv = self.galois_field.Inverse(r_dash)
-        l_dash_inv = self.galois_field.Inverse(l_dash)
+        # FI(KI_i_j, z) is table_j[z] ^ constant_j
+        _, _, KO_1, KO_2, KO_3, _, _, _, \
+            table_1, constant_1, table_2, constant_2, table_3, constant_3 = round_keys
 
-        r_dash_inv = r_dash_inv.to_bytes(2, "little")
-        l_dash_inv = l_dash_inv.to_bytes(2, "little")
+        l, r = r, table_1[l ^ KO_1] ^ constant_1 ^ r
+        l, r = r, table_2[l ^ KO_2] ^ constant_2 ^ r
+        l, r = r, table_3[l ^ KO_3] ^ constant_3 ^ r
 
-        x_dash = int.from_bytes(r_dash_inv + l_dash_inv, "little")
+        return l | r << 16
 
-        return x_dash
+    """
+        Kasumi feistel cipher of one block (bytes), returns an int
+    """
 
-    def FO(self, x, keys_dict):
-        x_bytes = x.to_bytes(4, "little")
+    def kasumi_feistel_encryption(self, clear_block, key, modified_key):
+        return self.encrypt_block(int.from_bytes(clear_block, "little"),
+                                  self.key_schedule(key, modified_key))
 
-        l = x_bytes[:2]  # LSB
-        r = x_bytes[2:]  # MSB
+    """
+        Kasumi feistel decipher of one block (bytes), returns an int
+    """
 
-        l = int.from_bytes(l, "little")
-        r = int.from_bytes(r, "little")
+    def kasumi_feistel_decryption(self, cipher_block, key, modified_key):
+        return self.decrypt_block(int.from_bytes(cipher_block, "little"),
+                                  self.key_schedule(key, modified_key))
 
-        for j in range(1, 4):
-            new_r = self.FI(keys_dict["KI_i_"+str(j)], l ^ keys_dict["KO_i_"+str(j)]) ^ r
-            l = r
-            r = new_r
+    """
+        Kasumi feistel cipher of one block (int) with the given key schedule
+    """
 
-        l = l.to_bytes(2, "little")
-        r = r.to_bytes(2, "little")
+    def encrypt_block(self, clear_block, key_schedule):
+        L = clear_block & 0xFFFFFFFF  # LSB
+        R = clear_block >> 32  # MSB
 
-        x_dash = int.from_bytes(l+r, "little")
+        for iteration, round_keys in enumerate(key_schedule.rounds):
+            # even
+            if iteration % 2 == 0:
+                new_L = self.FO(self.FL(L, round_keys), round_keys) ^ R
+            # odd
+            else:
+                new_L = self.FL(self.FO(L, round_keys), round_keys) ^ R
+            R = L
+            L = new_L
 
-        return x_dash
+        return L | R << 32
 
     """
-        Kasumi feistel cipher of one block
+        Kasumi feistel decipher of one block (int) with the given key schedule
     """
 
-    def kasumi_feistel_encryption(self, clear_block, key, modified_key):
-        L = clear_block[:4]  # LSB
-        R = clear_block[4:]  # MSB
-
-        L = int.from_bytes(L, "little")
-        R = int.from_bytes(R, "little")
-
-        for iteration in range(0, 8):
+    def decrypt_block(self, cipher_block, key_schedule):
+        L = cipher_block & 0xFFFFFFFF  # LSB
+        R = cipher_block >> 32  # MSB
 
-            keys_dict = self.generate_sub_key(key, modified_key, iteration)
+        for iteration in reversed(range(0, 8)):
+            round_keys = key_schedule.rounds[iteration]
+            new_L = R
             # even
             if iteration % 2 == 0:
-                new_L = self.FO(self.FL(L, keys_dict), keys_dict) ^ R
-                R = L
-                L = new_L
+                R = self.FO(self.FL(R, round_keys), round_keys) ^ L
             # odd
-            if iteration % 2 == 1:
-                new_L = self.FL(self.FO(L, keys_dict), keys_dict) ^ R
-                R = L
-                L = new_L
+            else:
+                R = self.FL(self.FO(R, round_keys), round_keys) ^ L
+            L = new_L
 
-        L = L.to_bytes(4, "little")
-        R = R.to_bytes(4, "little")
+        return L | R << 32
 
-        cipher_block = int.from_bytes(L+R, "little")
+    """
+        Kasumi feistel cipher / decipher of an uint64 array of blocks
+    """
 
-        return cipher_block
+    def encrypt_blocks(self, blocks, key_schedule):
+        return feistel_encryption_many(blocks, key_schedule.rounds, self.s_box_16_array,
+                                       self.galois_inverse_array)
+
+    def decrypt_blocks(self, blocks, key_schedule):
+        return feistel_decryption_many(blocks, key_schedule.rounds, self.s_box_16_array,
+                                       self.galois_inverse_array)
 
     """
-        Kasumi feistel decipher of one block
+        Returns true if 'num_blocks' blocks are worth splitting between
+        worker processes, for a parallelisable mode
     """
 
-    def kasumi_feistel_decryption(self, cipher_block, key, modified_key):
-        L = cipher_block[:4]  # LSB
-        R = cipher_block[4:]  # MSB
-
-        L = int.from_bytes(L, "little")
-        R = int.from_bytes(R, "little")
+    def use_parallel_blocks(self, num_blocks, decipher=False):
+        parallelisable = decipher or self.block_cipher_type in ("ECB", "CTR")
+        return parallelisable and self.parallel_workers > 1 and \
+            num_blocks * BLOC_SIZE_BYTES >= PARALLEL_MIN_BYTES
 
-        for iteration in reversed(range(0, 8)):
-            keys_dict = self.generate_sub_key(key, modified_key, iteration)
-            # even
-            if iteration % 2 == 0:
-                new_L = R
-                R = self.FO(self.FL(R, keys_dict), keys_dict) ^ L
-                L = new_L
-            # odd
-            if iteration % 2 == 1:
-                new_L = R
-                R = self.FL(self.FO(R, keys_dict), keys_dict) ^ L
-                L = new_L
+    """
+        cipher_blocks / decipher_blocks split between the worker processes,
+        for ECB, CTR and the decipher of CBC and PCBC
+    """
 
-        L = L.to_bytes(4, "little")
-        R = R.to_bytes(4, "little")
+    def parallel_blocks(self, data, key_schedule, vect, output, decipher=False):
+        num_blocks = len(data) // BLOC_SIZE_BYTES
+        data_size = num_blocks * BLOC_SIZE_BYTES
+
+        if self.parallel_resources["pool"] is None:
+            self.parallel_resources["pool"] = ProcessPoolExecutor(max_workers=self.parallel_workers)
+        shared_tables = self.parallel_resources["shared_tables"]
+        if (key_schedule.key, key_schedule.modified_key) not in shared_tables:
+            shared_tables[(key_schedule.key, key_schedule.modified_key)] = create_shared_tables(
+                self.s_box_16_array, self.galois_inverse_array, key_schedule.rounds)
+        tables_block = shared_tables[(key_schedule.key, key_schedule.modified_key)]
+
+        if self.block_cipher_type == "CTR":
+            operation = "counter"
+        elif not decipher:
+            operation = "encrypt"
+        elif self.block_cipher_type == "ECB":
+            operation = "decrypt"
+        else:
+            operation = "chained_decrypt"
+
+        input_block = shared_memory.SharedMemory(create=True, size=data_size)
+        output_block = shared_memory.SharedMemory(create=True, size=data_size)
+        try:
+            input_block.buf[:data_size] = data[:data_size]
+            jobs = [self.parallel_resources["pool"].submit(
+                        parallel_blocks_worker, tables_block.name, input_block.name, output_block.name,
+                        first_block, min(PARALLEL_SEGMENT_BLOCKS, num_blocks - first_block), operation, vect)
+                    for first_block in range(0, num_blocks, PARALLEL_SEGMENT_BLOCKS)]
+            for job in jobs:
+                job.result()
+            output[:data_size] = output_block.buf[:data_size]
+        finally:
+            input_block.close()
+            input_block.unlink()
+            output_block.close()
+            output_block.unlink()
+
+        last_block = int.from_bytes(data[data_size - BLOC_SIZE_BYTES: data_size], "little")
+        if self.block_cipher_type == "CTR":
+            return vect + num_blocks
+        if self.block_cipher_type == "CBC":
+            return last_block
+        if self.block_cipher_type == "PCBC":
+            clear_blocks = np.frombuffer(output, dtype="<u8", count=num_blocks)
+            clear_blocks[:] = np.bitwise_xor.accumulate(clear_blocks)
+            return int(clear_blocks[-1]) ^ last_block
+        return vect
 
-        clear_block = int.from_bytes(L+R, "little")
+    """
+        Initial chaining value of the block mode :
+            : CBC, PCBC : the initialization vector
+            : CTR : the counter of the first block
+    """
 
-        return clear_block
+    def initial_vector(self):
+        if self.block_cipher_type == "CTR":
+            return 0
+        return INITIALIZATION_NUMBER
 
     """
-        Kasumi feistel cipher of a whole message
-            : key provided by diffie hellman key exchange protocol
-            : iterated block cipher
+        Iterated block cipher of the aligned bytes 'data' into the writable buffer 'output'
+            : vect : the chaining value left by the previous blocks (see initial_vector)
+            : returns the chaining value for the next blocks
     """
 
-    def cipher_message(self, message, key, modified_key):
-        cipher_message = b""
-        bin_message = message.encode()
-        num_blocks = len(bin_message) // 8
+    def cipher_blocks(self, data, key_schedule, vect, output):
+        num_blocks = len(data) // BLOC_SIZE_BYTES
 
-        if num_blocks > 0:
+        if self.use_parallel_blocks(num_blocks):
+            return self.parallel_blocks(data, key_schedule, vect, output)
+
+        # parallelisable modes : all the blocks at once
+        if num_blocks >= BATCH_MIN_BLOCKS and self.block_cipher_type in ("ECB", "CTR"):
+            blocks = blocks_array(data, num_blocks)
             if self.block_cipher_type == "ECB":
-                for i in range(0, num_blocks+1):
-                    clear_block = bin_message[(i)*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
-                    cipher_block = self.kasumi_feistel_encryption(clear_block, key, modified_key)
-                    cipher_block = cipher_block.to_bytes(8, "little")
-                    cipher_message = cipher_message + cipher_block
+                store_blocks(self.encrypt_blocks(blocks, key_schedule), output)
+            if self.block_cipher_type == "CTR":
+                counters = np.arange(vect, vect + num_blocks, dtype=np.uint64)
+                store_blocks(blocks ^ self.encrypt_blocks(counters, key_schedule), output)
+                vect = vect + num_blocks
+            return vect
 
-            if self.block_cipher_type == "CBC":
-                vect = INITIALIZATION_NUMBER
-                for i in range(0, num_blocks+1):
-                    clear_block = bin_message[(i)*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
-                    clear_block = vect ^ int.from_bytes(clear_block, "little")
-                    clear_block = clear_block.to_bytes(8, "little")
-                    cipher_block = self.kasumi_feistel_encryption(clear_block, key, modified_key)
-                    vect = cipher_block
+        for i in range(0, num_blocks):
+            clear_block = int.from_bytes(data[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES], "little")
+
+            if self.block_cipher_type == "ECB":
+                cipher_block = self.encrypt_block(clear_block, key_schedule)
 
-                    cipher_block = cipher_block.to_bytes(8, "little")
-                    cipher_message = cipher_message + cipher_block
+            if self.block_cipher_type == "CBC":
+                cipher_block = self.encrypt_block(vect ^ clear_block, key_schedule)
+                vect = cipher_block
 
             if self.block_cipher_type == "PCBC":
-                vect = INITIALIZATION_NUMBER
-                for i in range(0, num_blocks+1):
-                    clear_block = bin_message[(i)*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
+                cipher_block = self.encrypt_block(vect ^ clear_block, key_schedule)
+                vect = clear_block ^ cipher_block
+
+            if self.block_cipher_type == "CTR":
+                cipher_block = clear_block ^ self.encrypt_block(vect, key_schedule)
+                vect = vect + 1
+
+            output[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES] = cipher_block.to_bytes(8, "little")
+        return vect
+
+    """
+        Iterated block decipher of the aligned bytes 'data' into the writable buffer 'output'
+            : vect : the chaining value left by the previous blocks (see initial_vector)
+            : returns the chaining value for the next blocks
 
-                    xored_clear_block = vect ^ int.from_bytes(clear_block, "little")
-                    xored_clear_block = xored_clear_block.to_bytes(8, "little")
-                    cipher_block = self.kasumi_feistel_encryption(
-                        xored_clear_block, key, modified_key)
-                    vect = int.from_bytes(clear_block, "little") ^ cipher_block
+        > every mode is parallelisable :
+            : CBC : P_i = D(C_i) ^ C_i-1
+            : PCBC : P_i = D(C_i) ^ C_i-1 ^ P_i-1, a cumulative xor of D(C_i) ^ C_i-1
+    """
+
+    def decipher_blocks(self, data, key_schedule, vect, output):
+        num_blocks = len(data) // BLOC_SIZE_BYTES
+
+        if self.use_parallel_blocks(num_blocks, decipher=True):
+            return self.parallel_blocks(data, key_schedule, vect, output, decipher=True)
 
-                    cipher_block = cipher_block.to_bytes(8, "little")
-                    cipher_message = cipher_message + cipher_block
+        if num_blocks >= BATCH_MIN_BLOCKS:
+            blocks = blocks_array(data, num_blocks)
 
             if self.block_cipher_type == "CTR":
-                vect = 0
-                for i in range(0, num_blocks+1):
-                    clear_block = bin_message[(i)*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
+                counters = np.arange(vect, vect + num_blocks, dtype=np.uint64)
+                store_blocks(blocks ^ self.encrypt_blocks(counters, key_schedule), output)
+                return vect + num_blocks
 
-                    cipher_vect = self.kasumi_feistel_encryption(
-                        vect.to_bytes(8, "little"), key, modified_key)
+            clear_blocks = self.decrypt_blocks(blocks, key_schedule)
+            if self.block_cipher_type == "ECB":
+                store_blocks(clear_blocks, output)
+                return vect
 
-                    cipher_block = int.from_bytes(clear_block, "little") ^ cipher_vect
-                    vect = vect + 1
+            previous_blocks = np.concatenate((np.array([vect], dtype=np.uint64), blocks[:-1]))
+            clear_blocks = clear_blocks ^ previous_blocks
+            if self.block_cipher_type == "CBC":
+                store_blocks(clear_blocks, output)
+                return int(blocks[-1])
 
-                    cipher_block = cipher_block.to_bytes(8, "little")
-                    cipher_message = cipher_message + cipher_block
-        else:
-            cipher_message = self.kasumi_feistel_encryption(bin_message, key, modified_key)
-            cipher_message = cipher_message.to_bytes(8, "little")
+            if self.block_cipher_type == "PCBC":
+                clear_blocks = np.bitwise_xor.accumulate(clear_blocks)
+                store_blocks(clear_blocks, output)
+                return int(clear_blocks[-1] ^ blocks[-1])
+
+        for i in range(0, num_blocks):
+            cipher_block = int.from_bytes(data[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES], "little")
+
+            if self.block_cipher_type == "ECB":
+                clear_block = self.decrypt_block(cipher_block, key_schedule)
+
+            if self.block_cipher_type == "CBC":
+                clear_block = self.decrypt_block(cipher_block, key_schedule) ^ vect
+                vect = cipher_block
 
-        return cipher_message
+            if self.block_cipher_type == "PCBC":
+                clear_block = self.decrypt_block(cipher_block, key_schedule) ^ vect
+                vect = clear_block ^ cipher_block
+
+            if self.block_cipher_type == "CTR":
+                clear_block = cipher_block ^ self.encrypt_block(vect, key_schedule)
+                vect = vect + 1
+
+            output[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES] = clear_block.to_bytes(8, "little")
+        return vect
 
     """
-        Kasumi feistel decipher of a whole message
+        Kasumi feistel cipher of a whole message
             : key provided by diffie hellman key exchange protocol
             : iterated block cipher
+
+        > the message is zero padded up to the next block (one whole block
+            when aligned), a message shorter than a block is ciphered alone
     """
 
-    def decipher_message(self, cipher_message_bin, key, modified_key):
-        clear_message = b""
-        num_blocks = len(cipher_message_bin) // 8
+    def cipher_message(self, message, key, modified_key):
+        key_schedule = self.key_schedule(key, modified_key)
+        bin_message = message.encode()
+        num_blocks = len(bin_message) // 8
 
-        if num_blocks > 1:
-            if self.block_cipher_type == "ECB":
-                for i in range(0, num_blocks):
-                    cipher_block = cipher_message_bin[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
-                    clear_block = self.kasumi_feistel_decryption(cipher_block, key, modified_key)
-                    clear_block = clear_block.to_bytes(8, "little")
+        if num_blocks == 0:
+            cipher_message = self.encrypt_block(int.from_bytes(bin_message, "little"), key_schedule)
+            return cipher_message.to_bytes(8, "little")
 
-                    clear_message = clear_message + clear_block
+        cipher_message = bytearray((num_blocks + 1) * BLOC_SIZE_BYTES)
+        padded_message = bin_message.ljust(len(cipher_message), b"\0")
+        self.cipher_blocks(padded_message, key_schedule, self.initial_vector(), cipher_message)
+        return bytes(cipher_message)
 
-            if self.block_cipher_type == "CBC":
-                vect = INITIALIZATION_NUMBER
-                for i in range(0, num_blocks):
-                    cipher_block = cipher_message_bin[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
-                    clear_block = self.kasumi_feistel_decryption(cipher_block, key, modified_key)
-                    clear_block = clear_block ^ vect
+    """
+        Kasumi feistel decipher of a whole message
+            : key provided by diffie hellman key exchange protocol
+            : iterated block cipher
 
-                    vect = int.from_bytes(cipher_block, "little")
-                    clear_block = clear_block.to_bytes(8, "little")
+        > CTR deciphers one more (zero padded) block
+    """
 
-                    clear_message = clear_message + clear_block
+    def decipher_message(self, cipher_message_bin, key, modified_key):
+        key_schedule = self.key_schedule(key, modified_key)
+        num_blocks = len(cipher_message_bin) // 8
 
-            if self.block_cipher_type == "PCBC":
-                vect = INITIALIZATION_NUMBER
-                for i in range(0, num_blocks):
-                    cipher_block = cipher_message_bin[i*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
-                    clear_block = self.kasumi_feistel_decryption(cipher_block, key, modified_key)
-                    clear_block = clear_block ^ vect
+        if num_blocks <= 1:
+            clear_message = self.decrypt_block(int.from_bytes(cipher_message_bin, "little"), key_schedule)
+            return clear_message.to_bytes(8, "little")
 
-                    vect = clear_block ^ int.from_bytes(cipher_block, "little")
-                    clear_block = clear_block.to_bytes(8, "little")
+        if self.block_cipher_type == "CTR":
+            num_blocks = num_blocks + 1
 
-                    clear_message = clear_message + clear_block
+        clear_message = bytearray(num_blocks * BLOC_SIZE_BYTES)
+        cipher_message_bin = bytes(cipher_message_bin[:len(clear_message)]).ljust(len(clear_message), b"\0")
+        self.decipher_blocks(cipher_message_bin, key_schedule, self.initial_vector(), clear_message)
+        return bytes(clear_message)
 
-            if self.block_cipher_type == "CTR":
-                vect = 0
-                for i in range(0, num_blocks+1):
-                    cipher_block = cipher_message_bin[(i)*BLOC_SIZE_BYTES: (i+1)*BLOC_SIZE_BYTES]
+    """
+        Kasumi cipher of a binary stream, chunk by chunk, in constant memory
+            : reader : binary file-like object (readinto)
+            : writer : binary file-like object (write)
 
-                    cipher_vect = self.kasumi_feistel_encryption(
-                        vect.to_bytes(8, "little"), key, modified_key)
+        > the output is the same as cipher_message on the whole content
+    """
 
-                    clear_block = int.from_bytes(cipher_block, "little") ^ cipher_vect
-                    vect = vect + 1
+    def encrypt_stream(self, reader, writer, key, modified_key, chunk_size=STREAM_CHUNK_SIZE):
+        key_schedule = self.key_schedule(key, modified_key)
+        chunk_size = max(2 * BLOC_SIZE_BYTES, chunk_size - chunk_size % BLOC_SIZE_BYTES)
+        clear_chunk = memoryview(bytearray(chunk_size))
+        cipher_chunk = memoryview(bytearray(chunk_size))
+        vect = self.initial_vector()
+
+        filled = read_chunk(reader, clear_chunk)
+        if filled < BLOC_SIZE_BYTES:
+            cipher_block = self.encrypt_block(int.from_bytes(clear_chunk[:filled], "little"), key_schedule)
+            writer.write(cipher_block.to_bytes(8, "little"))
+            return
+
+        while filled == chunk_size:
+            vect = self.cipher_blocks(clear_chunk, key_schedule, vect, cipher_chunk)
+            writer.write(cipher_chunk)
+            filled = read_chunk(reader, clear_chunk)
+
+        # last chunk : zero padded up to the next block
+        end = filled - filled % BLOC_SIZE_BYTES + BLOC_SIZE_BYTES
+        clear_chunk[filled:end] = bytes(end - filled)
+        self.cipher_blocks(clear_chunk[:end], key_schedule, vect, cipher_chunk)
+        writer.write(cipher_chunk[:end])
 
-                    clear_block = clear_block.to_bytes(8, "little")
-                    clear_message = clear_message + clear_block
-        else:
-            clear_message = self.kasumi_feistel_decryption(cipher_message_bin, key, modified_key)
-            clear_message = clear_message.to_bytes(8, "little")
+    """
+        Kasumi decipher of a binary stream, chunk by chunk, in constant memory
+            : reader : binary file-like object (readinto)
+            : writer : binary file-like object (write)
+
+        > the output is the same as decipher_message on the whole content
+    """
 
-        return clear_message
+    def decrypt_stream(self, reader, writer, key, modified_key, chunk_size=STREAM_CHUNK_SIZE):
+        key_schedule = self.key_schedule(key, modified_key)
+        chunk_size = max(2 * BLOC_SIZE_BYTES, chunk_size - chunk_size % BLOC_SIZE_BYTES)
+        cipher_chunk = memoryview(bytearray(chunk_size))
+        clear_chunk = memoryview(bytearray(chunk_size))
+        vect = self.initial_vector()
+
+        filled = read_chunk(reader, cipher_chunk)
+        if filled < 2 * BLOC_SIZE_BYTES:
+            writer.write(self.decipher_message(cipher_chunk[:filled], key, modified_key))
+            return
+
+        while filled == chunk_size:
+            vect = self.decipher_blocks(cipher_chunk, key_schedule, vect, clear_chunk)
+            writer.write(clear_chunk)
+            filled = read_chunk(reader, cipher_chunk)
+
+        # last chunk : the incomplete block is dropped, but for CTR
+        end = filled - filled % BLOC_SIZE_BYTES
+        if self.block_cipher_type == "CTR":
+            end = end + BLOC_SIZE_BYTES
+            cipher_chunk[filled:end] = bytes(end - filled)
+        self.decipher_blocks(cipher_chunk[:end], key_schedule, vect, clear_chunk)
+        writer.write(clear_chunk[:end])
 
     """
         kasumi cipher and decipher a file
     """
 
-    def kasumi_demo(self):
+    def kasumi_demo(self, key, modified_key):
         with open("fichier_clair", "rb") as clear_file:
             with open("fichier_chiffre", "wb") as crypted_file:
-                for clear_block in lecture_bloc(clear_file, BLOC_SIZE_BYTES):
-                    crypted_block = self.kasumi_feistel_encryption(clear_block, key, modified_key)
-                    crypted_file.write(crypted_block.to_bytes(8, "little"))
+                self.encrypt_stream(clear_file, crypted_file, key, modified_key)
 
         with open("fichier_chiffre", "rb") as crypted_file:
             with open("new_clear_file", "wb") as new_file:
-                for crypted_block in lecture_bloc(crypted_file, BLOC_SIZE_BYTES):
-                    clear_block = self.kasumi_feistel_decryption(crypted_block, key, modified_key)
-                    new_file.write(clear_block.to_bytes(8, "little"))
+                self.decrypt_stream(crypted_file, new_file, key, modified_key)
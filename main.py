@@ -5,8 +5,8 @@ import server
 
 """
     modules tiers
-        : pyfinite
         : bitstring
+        : numpy
 
 """
 
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import time
+
+"""
+    This module provides the modular exponentiation engine
+        : modexp : uniform entry point, the built-in three arguments
+            pow (C implementation)
+        : sliding window exponentiation
+        : square and multiply (bit by bit) exponentiation
+        : fixed base exponentiation, with a table of precomputed powers
+            of the base, serialisable to a file
+"""
+
+SLIDING_WINDOW_SIZE = 5
+FIXED_BASE_WINDOW_SIZE = 6
+
+
+"""
+    Compute base ^ exponent mod modulus, exponent >= 0
+"""
+
+
+def modexp(base, exponent, modulus):
+    return pow(base, exponent, modulus)
+
+
+"""
+    Sliding window exponentiation : the exponent bits are read by windows
+    starting and ending with a 1, each window costs one multiplication
+    by a precomputed odd power of the base
+"""
+
+
+def sliding_window_exponentiation(base, exponent, modulus, window_size=SLIDING_WINDOW_SIZE):
+    if modulus == 1:
+        return 0
+    base = base % modulus
+    square = base * base % modulus
+    odd_powers = [base]
+    for _ in range((1 << (window_size - 1)) - 1):
+        odd_powers.append(odd_powers[-1] * square % modulus)
+
+    bits = bin(exponent)[2:]
+    result = 1
+    i = 0
+    while i < len(bits):
+        if bits[i] == "0":
+            result = result * result % modulus
+            i = i + 1
+            continue
+
+        j = min(i + window_size, len(bits))
+        while bits[j-1] == "0":
+            j = j - 1
+        for _ in range(j - i):
+            result = result * result % modulus
+        result = result * odd_powers[int(bits[i:j], 2) >> 1] % modulus
+        i = j
+
+    return result
+
+
+"""
+    Right to left binary exponentiation, one bit at a time
+"""
+
+
+def square_and_multiply(base, exponent, modulus):
+    result = 1 % modulus
+    while exponent != 0:
+        if exponent & 1:
+            result = (result * base) % modulus
+        base = (base * base) % modulus
+        exponent = exponent >> 1
+    return result
+
+
+"""
+    Fixed base exponentiation : the exponent is cut in windows of
+    'window_size' bits, row i of the table holds the powers
+    base ^ (d * 2 ^ (window_size * i)) for every window value d.
+    A power then costs one multiplication per non zero window, no squaring.
+
+    > exponents longer than 'exponent_bits' bits fall back to modexp
+"""
+
+
+class FixedBaseTable:
+    def __init__(self, base, modulus, window_size=FIXED_BASE_WINDOW_SIZE, exponent_bits=None, table=None):
+        self.base = base % modulus
+        self.modulus = modulus
+        self.window_size = window_size
+        self.exponent_bits = modulus.bit_length() if exponent_bits is None else exponent_bits
+        self.table = self.build_table() if table is None else table
+
+    def build_table(self):
+        number_of_windows = -(-self.exponent_bits // self.window_size)
+        table = []
+        window_base = self.base
+        for _ in range(number_of_windows):
+            row = [1 % self.modulus]
+            for _ in range((1 << self.window_size) - 1):
+                row.append(row[-1] * window_base % self.modulus)
+            table.append(row)
+            window_base = row[-1] * window_base % self.modulus
+        return table
+
+    # returns base ^ exponent mod modulus
+    def power(self, exponent):
+        if exponent < 0 or exponent.bit_length() > self.exponent_bits:
+            return modexp(self.base, exponent, self.modulus)
+        mask = (1 << self.window_size) - 1
+        result = 1 % self.modulus
+        for row in self.table:
+            if exponent == 0:
+                break
+            digit = exponent & mask
+            if digit:
+                result = result * row[digit] % self.modulus
+            exponent = exponent >> self.window_size
+        return result
+
+    """
+        File format : a JSON header line (base, modulus, window size,
+        exponent bits), then every table entry as a big endian integer
+        of the modulus byte length
+    """
+
+    def save(self, file_name):
+        entry_len = (self.modulus.bit_length() + 7) // 8
+        header = {"base": self.base, "modulus": self.modulus,
+                  "window_size": self.window_size, "exponent_bits": self.exponent_bits}
+        with open(file_name, "wb") as file:
+            file.write(json.dumps(header).encode() + b"\n")
+            for row in self.table:
+                file.write(b"".join(value.to_bytes(entry_len, "big") for value in row))
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name, "rb") as file:
+            header = json.loads(file.readline())
+            data = file.read()
+
+        modulus = header["modulus"]
+        entry_len = (modulus.bit_length() + 7) // 8
+        row_len = (1 << header["window_size"]) * entry_len
+        number_of_windows = -(-header["exponent_bits"] // header["window_size"])
+        if len(data) != number_of_windows * row_len:
+            raise ValueError(f"{file_name} : truncated fixed base table")
+
+        table = [[int.from_bytes(data[position:position + entry_len], "big")
+                  for position in range(row_start, row_start + row_len, entry_len)]
+                 for row_start in range(0, len(data), row_len)]
+        return cls(header["base"], modulus, header["window_size"], header["exponent_bits"], table)
+
+
+# fixed base tables in use, by (base, modulus)
+fixed_base_tables = {}
+
+
+"""
+    Returns the fixed base table of (base, modulus) and keeps it in memory
+        : loaded from 'file_name' when the file holds the table of the same
+            base and modulus
+        : built otherwise, then saved to 'file_name' if given
+"""
+
+
+def fixed_base_table(base, modulus, file_name=None):
+    key = (base % modulus, modulus)
+    if key in fixed_base_tables:
+        return fixed_base_tables[key]
+
+    table = None
+    if file_name is not None:
+        try:
+            table = FixedBaseTable.load(file_name)
+        except (FileNotFoundError, ValueError):
+            table = None
+        if table is not None and (table.base, table.modulus) != key:
+            table = None
+
+    if table is None:
+        table = FixedBaseTable(base, modulus)
+        if file_name is not None:
+            table.save(file_name)
+
+    fixed_base_tables[key] = table
+    return table
+
+
+"""
+    base ^ exponent mod modulus, with the fixed base table of (base, modulus)
+    when one is in memory, with modexp otherwise
+"""
+
+
+def fixed_base_modexp(base, exponent, modulus):
+    table = fixed_base_tables.get((base % modulus, modulus))
+    if table is None:
+        return modexp(base, exponent, modulus)
+    return table.power(exponent)
+
+
+"""
+    Benchmark of the engines over 512 and 1024 bits operands
+"""
+
+if __name__ == '__main__':
+    import tools
+
+    engines = [("square and multiply", square_and_multiply),
+               ("sliding window", sliding_window_exponentiation),
+               ("built-in pow", pow)]
+
+    for bits in (512, 1024):
+        operands = [(random.getrandbits(bits), random.getrandbits(bits), random.getrandbits(bits) | 1 << (bits - 1) | 1)
+                    for _ in range(20)]
+        for name, engine in engines:
+            start = time.perf_counter()
+            for base, exponent, modulus in operands:
+                engine(base, exponent, modulus)
+            elapsed = (time.perf_counter() - start) / len(operands)
+            print(f"{bits} bits {name:>20} : {elapsed * 1000:.3f} ms")
+
+        base, _, modulus = operands[0]
+        start = time.perf_counter()
+        table = FixedBaseTable(base, modulus)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _, exponent, _ in operands:
+            table.power(exponent)
+        elapsed = (time.perf_counter() - start) / len(operands)
+        print(f"{bits} bits {'fixed base table':>20} : {elapsed * 1000:.3f} ms (built in {build_time * 1000:.1f} ms)")
+
+        # El Gamal check : h ^ s_1 * s_1 ^ s_2 mod p
+        start = time.perf_counter()
+        for base, exponent, modulus in operands:
+            modexp(base, exponent, modulus) * modexp(exponent, base, modulus) % modulus
+        elapsed = (time.perf_counter() - start) / len(operands)
+        print(f"{bits} bits {'two pow products':>20} : {elapsed * 1000:.3f} ms")
+        start = time.perf_counter()
+        for base, exponent, modulus in operands:
+            tools.multi_exponentiation([base, exponent], [exponent, base], modulus)
+        elapsed = (time.perf_counter() - start) / len(operands)
+        print(f"{bits} bits {'multi exponentiation':>20} : {elapsed * 1000:.3f} ms")
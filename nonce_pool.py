@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import random
+from collections import deque
+from threading import Condition, Thread
+
+import tools
+from modexp import fixed_base_modexp
+
+"""
+    El Gamal nonce pool : the message independent part of an El Gamal
+    signature, precomputed by a background thread
+
+        : nonce : (y, alpha ^ y mod p, y^-1 mod p-1), y invertible mod p-1
+        : refill : when the pool goes below the low water mark, it is
+            filled up to its size, the inverses of a whole batch are
+            computed with a single inversion (tools.mod_inverse_many)
+"""
+
+NONCE_POOL_SIZE = 64
+NONCE_POOL_LOW_WATER = 16
+NONCE_BATCH_SIZE = 16
+
+
+class ElGamalNoncePool(Thread):
+
+    def __init__(self, p, alpha, size=NONCE_POOL_SIZE, low_water=NONCE_POOL_LOW_WATER):
+        Thread.__init__(self, daemon=True)
+        self.p = p
+        self.alpha = alpha
+        self.size = size
+        self.low_water = low_water
+        self.nonces = deque()
+        self.condition = Condition()
+        self.closed = False
+
+    """
+        Returns 'count' new nonces, p-1 = 2q : every odd y but q is invertible
+    """
+
+    def generate_nonces(self, count):
+        q = (self.p - 1) // 2
+        ys = []
+        while len(ys) < count:
+            y = random.randint(1, self.p-2) | 1
+            if y != q:
+                ys.append(y)
+        y_invs = tools.mod_inverse_many(ys, self.p-1)
+        return [(y, fixed_base_modexp(self.alpha, y, self.p), y_inv) for y, y_inv in zip(ys, y_invs)]
+
+    # returns a nonce, computed on the spot if the pool is empty
+    def pop(self):
+        with self.condition:
+            nonce = self.nonces.popleft() if self.nonces else None
+            if len(self.nonces) < self.low_water:
+                self.condition.notify()
+        if nonce is None:
+            nonce = self.generate_nonces(1)[0]
+        return nonce
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and len(self.nonces) >= self.low_water:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                missing = self.size - len(self.nonces)
+
+            while missing > 0:
+                nonces = self.generate_nonces(min(missing, NONCE_BATCH_SIZE))
+                with self.condition:
+                    self.nonces.extend(nonces)
+                missing = missing - len(nonces)
+
+
+# running nonce pools, by (p, alpha)
+nonce_pools = {}
+
+
+"""
+    Returns the nonce pool of the El Gamal key (p, alpha),
+    the pool is started on the first call
+"""
+
+
+def get_nonce_pool(p, alpha):
+    if (p, alpha) not in nonce_pools:
+        pool = ElGamalNoncePool(p, alpha)
+        pool.start()
+        nonce_pools[(p, alpha)] = pool
+    return nonce_pools[(p, alpha)]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import time
+
+import tools
+
+"""
+    Safe prime pool : 512 bits safe primes generated in the background,
+    stored one per file in a directory, and claimed by the new clients
+
+        : claim : the pool file is renamed to the client prime file,
+            the rename is atomic so a prime is never claimed twice
+        : refill : when the pool goes below the low water mark,
+            it is filled up to the target inventory
+"""
+
+POOL_DIRECTORY = "safe_prime_pool"
+POOL_TARGET = 8
+POOL_LOW_WATER = 4
+POLL_INTERVAL_SECONDS = 5
+
+PRIME_FILE_SUFFIX = ".prime"
+
+
+"""
+    Returns the paths of the unclaimed safe primes of the pool
+"""
+
+
+def pool_inventory(directory=POOL_DIRECTORY):
+    try:
+        file_names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(directory, file_name) for file_name in file_names
+                  if file_name.endswith(PRIME_FILE_SUFFIX))
+
+
+"""
+    Adds a safe prime to the pool, the file only appears once fully written
+"""
+
+
+def add_safe_prime(safe_prime, directory=POOL_DIRECTORY):
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"safe_512_prime_{time.time_ns()}_{os.getpid()}"
+    temporary_path = os.path.join(directory, file_name + ".tmp")
+    with open(temporary_path, "w") as file:
+        file.write(str(safe_prime))
+    os.replace(temporary_path, os.path.join(directory, file_name + PRIME_FILE_SUFFIX))
+
+
+"""
+    Moves an unclaimed safe prime of the pool to 'destination_file',
+    returns False if the pool is empty
+"""
+
+
+def claim_safe_prime(destination_file, directory=POOL_DIRECTORY):
+    for path in pool_inventory(directory):
+        try:
+            os.rename(path, destination_file)
+            return True
+        # claimed by another client in the meantime
+        except FileNotFoundError:
+            continue
+    return False
+
+
+"""
+    Fills the pool up to 'target' safe primes
+"""
+
+
+def refill(directory=POOL_DIRECTORY, target=POOL_TARGET, workers=None):
+    missing = target - len(pool_inventory(directory))
+    if missing <= 0:
+        return
+    print(f"*** generating {missing} safe prime(s) for the pool ***")
+    for safe_prime in tools.find_safe_512_bits_primes_parallel(missing, workers=workers):
+        add_safe_prime(safe_prime, directory)
+
+
+"""
+    Pool service : refills the pool every time it goes below the low water mark
+"""
+
+
+def run_pool_service(directory=POOL_DIRECTORY, target=POOL_TARGET, low_water=POOL_LOW_WATER,
+                     poll_interval=POLL_INTERVAL_SECONDS, workers=None):
+    while True:
+        if len(pool_inventory(directory)) < low_water:
+            refill(directory, target, workers)
+            print(f"*** safe prime pool : {len(pool_inventory(directory))} prime(s) ***")
+        time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Background generation of 512 bits safe primes")
+    parser.add_argument("--directory", default=POOL_DIRECTORY, help="pool directory")
+    parser.add_argument("--target", type=int, default=POOL_TARGET, help="target inventory")
+    parser.add_argument("--low-water", type=int, default=POOL_LOW_WATER,
+                        help="the pool is refilled under this inventory")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL_SECONDS,
+                        help="seconds between two inventory checks")
+    parser.add_argument("--workers", type=int, default=None, help="number of generator processes")
+    parser.add_argument("--once", action="store_true", help="fill the pool up to the target and exit")
+    arguments = parser.parse_args()
+
+    if arguments.once:
+        refill(arguments.directory, arguments.target, arguments.workers)
+    else:
+        run_pool_service(arguments.directory, arguments.target, arguments.low_water,
+                         arguments.poll_interval, arguments.workers)
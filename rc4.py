@@ -1,36 +1,76 @@
-import math
+import array
+import time
 
 
 class rc4:
     def __init__(self, key, state_len=256):
-        self.S = list(range(state_len))
+        # byte state when the values fit in a byte, 16 bits words when they fit
+        # in 16 bits, words of at least 32 bits otherwise
+        if state_len <= 256:
+            S = bytearray(range(state_len))
+        elif state_len <= 1 << 16:
+            S = array.array('H', range(state_len))
+        else:
+            S = array.array('L', range(state_len))
         self.x = 0
         self.y = 0
 
         j = 0
-        for i in range(len(self.S)):
-            j = (j + self.S[i] + key[i % (len(key))]) % len(self.S)
-            self.S[i], self.S[j] = self.S[j], self.S[i]
+        key_len = len(key)
+        for i in range(state_len):
+            j = (j + S[i] + key[i % key_len]) % state_len
+            S[i], S[j] = S[j], S[i]
+        self.S = S
 
     # returns a single pseudo-random int
     def get_byte(self):
-        self.x = (self.x + 1) % len(self.S)
-        self.y = (self.y + self.S[self.x]) % len(self.S)
-        self.S[self.x], self.S[self.y] = self.S[self.y], self.S[self.x]
-        return self.S[(self.S[self.x] + self.S[self.y]) % len(self.S)]
+        S = self.S
+        self.x = (self.x + 1) % len(S)
+        self.y = (self.y + S[self.x]) % len(S)
+        S[self.x], S[self.y] = S[self.y], S[self.x]
+        return S[(S[self.x] + S[self.y]) % len(S)]
+
+    # fills the given writable buffer with generated pseudo-random ints
+    def fill(self, output):
+        S = self.S
+        state_len = len(S)
+        x = self.x
+        y = self.y
+        for i in range(len(output)):
+            x = (x + 1) % state_len
+            S_x = S[x]
+            y = (y + S_x) % state_len
+            S_y = S[y]
+            S[x] = S_y
+            S[y] = S_x
+            output[i] = S[(S_x + S_y) % state_len]
+        self.x = x
+        self.y = y
+        return output
 
     # returns a generated pseudo-random int array of given length
     def get_bytes(self, length):
-        output = []
-        for i in range(length):
-            output.append(self.get_byte())
-        return output
+        if isinstance(self.S, bytearray):
+            return list(self.fill(bytearray(length)))
+        return list(self.fill(array.array(self.S.typecode, bytes(length * self.S.itemsize))))
+
+    # returns 'length' generated pseudo-random bytes
+    def keystream(self, length):
+        if not isinstance(self.S, bytearray):
+            raise ValueError("keystream needs a state of at most 256 values")
+        return bytes(self.fill(bytearray(length)))
+
+    # cipher/decipher the bytes 'src' into the writable buffer 'dst' (at least as long as 'src')
+    def cipher_into(self, src, dst):
+        length = len(src)
+        keystream = int.from_bytes(self.keystream(length), "little")
+        dst[:length] = (int.from_bytes(src, "little") ^ keystream).to_bytes(length, "little")
+        return dst
 
     # cipher/decipher a bytes message
     def cipher(self, message):
-        output = bytearray()
-        for i in range(len(message)):
-            output.append(self.get_byte() ^ message[i])
+        output = bytearray(len(message))
+        self.cipher_into(message, memoryview(output))
         return output
 
     # returns S, a pseudo random permutation order list of state_len (arg given at object instantiation)
@@ -51,4 +91,31 @@ print(encrypted.hex())
 rc4_receiver = rc4(RC4_INPUT_KEY)
 clear_message = rc4_receiver.cipher(encrypted)
 print(clear_message.decode('utf-8'))
-'''
\ No newline at end of file
+'''
+
+
+"""
+    Microbenchmark : byte per byte generator (previous cipher loop)
+    against the bulk keystream and in-place cipher
+"""
+
+if __name__ == '__main__':
+    message = bytes(1 << 20)
+    output = memoryview(bytearray(len(message)))
+
+    def byte_per_byte_cipher(prng, message):
+        cipher = bytearray()
+        for i in range(len(message)):
+            cipher.append(prng.get_byte() ^ message[i])
+        return cipher
+
+    benchmarks = [("byte per byte", lambda prng: byte_per_byte_cipher(prng, message)),
+                  ("keystream", lambda prng: prng.keystream(len(message))),
+                  ("cipher_into", lambda prng: prng.cipher_into(message, output))]
+
+    for name, benchmark in benchmarks:
+        prng = rc4(b"secretKey")
+        start = time.perf_counter()
+        benchmark(prng)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>14} : {len(message) / elapsed / 2 ** 20:.2f} MB/s")
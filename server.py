@@ -7,6 +7,7 @@ import json
 import struct
 
 from blockchain import Transaction, Blockchain
+from signature_cache import CACHE_FILE_SUFFIX, verified_signatures
 
 """
     Alice <------>  Server <----->  Bob
@@ -178,6 +179,9 @@ class ServerThread(Thread):
             # print("\n=========================================================\n")
             if self.blockchain is not None:
                 response["content"] = f"Blockchain verification status: {self.blockchain.verify()}\n"
+                # the verified signatures survive server restarts
+                verified_signatures.save("gs15_blockchain" + CACHE_FILE_SUFFIX)
+                print(f"\tverified signatures cache : {verified_signatures.stats()}")
             else:
                 response["content"] = "No blockchain to verify !"
             self.send_json_message(response, self.client_name)
@@ -206,6 +210,8 @@ if __name__ == '__main__':
     # dictionnary that maps the client name to his socket reference
     client_conections_dict = {}
 
+    verified_signatures.load("gs15_blockchain" + CACHE_FILE_SUFFIX)
+
     while True:
         print("waiting for new client ...\n")
         client_conection, connection_data = server_socket.accept()
@@ -2,56 +2,78 @@
 
 import tools
 import random
-from spongeHash import sponge_hash
+from modexp import fixed_base_modexp, fixed_base_table, modexp
+from spongeHash import sponge_hash, sponge_hash_many
 
 """
     This module provides the implementation of
         : El Gamal signature
         : RSA Signature
         : Diffie Hellman key exchange protocol
+        : batch verification of El Gamal signatures
 """
 
+# bits of the random exponents of the batch verifications :
+# a batch holding a wrong signature passes with probability 2^-BATCH_SECURITY_BITS
+BATCH_SECURITY_BITS = 64
+
+
+# returns the hash (as an integer) of a message, as signed by El Gamal and RSA
+def hash_message(message):
+    h_M = sponge_hash(message.encode(), hash_length_bytes=32)
+    return int.from_bytes(h_M, "little")
+
+
 # ================ EL Gamal Signature =================
 
 """
     Initialization of El Gamal Signature,
     Public Key : p, alpha, h
     Private key : x
+
+    > the fixed base table of alpha is kept in memory
+        and saved to 'table_file' if given
 """
 
 
-def init_El_Gamal_Signature(p):
-    alpha = tools.find_generator(p)
+def init_El_Gamal_Signature(p, table_file=None):
+    _, __, alpha = tools.group_parameters(p)
     x = random.randint(1, p-2)
-    h = tools.fast_exponentiation(alpha, x, mod=p)
+    h = fixed_base_table(alpha, p, table_file).power(x)
     return p, alpha, h, x
 
 
 """
     Signe a message or a file with El Gamal signature,
     using spongeHash function
+
+    > nonce_pool : the nonce (y, alpha ^ y, y^-1) is taken from this
+        precomputed pool (nonce_pool.ElGamalNoncePool) instead
+    > digest : hash_message(message), when already computed
 """
 
 
-def El_Gamal_Signature(p, alpha, h, x, message=None, file_name=None):
-    if message == None and file_name == None:
+def El_Gamal_Signature(p, alpha, h, x, message=None, file_name=None, nonce_pool=None, digest=None):
+    if message == None and file_name == None and digest == None:
         print("error : please enter a message or a filname to sign")
 
-    y = random.randint(1, p-2)
-
-    while not tools.rabin_Miller_test(y):
-        y = random.randint(1, p-2)
-
     if file_name != None:
         with open(file_name, "r") as file:
             message = file.read()
 
-    h_M = sponge_hash(message.encode(), hash_length_bytes=32)
-    h_M = int.from_bytes(h_M, "little")
+    h_M = hash_message(message) if digest == None else digest
+
+    if nonce_pool is not None:
+        y, s_1, y_inv = nonce_pool.pop()
+    else:
+        y = random.randint(1, p-2)
+
+        while not tools.rabin_Miller_test(y):
+            y = random.randint(1, p-2)
 
-    _, __, y_inv = tools.PGCD_bezout(y, p-1)
+        _, __, y_inv = tools.PGCD_bezout(y, p-1)
+        s_1 = fixed_base_modexp(alpha, y, p)
 
-    s_1 = tools.fast_exponentiation(alpha, y, mod=p)
     s_2 = y_inv * (h_M - x*s_1) % (p-1)
 
     return [s_1, s_2]
@@ -60,11 +82,13 @@ def El_Gamal_Signature(p, alpha, h, x, message=None, file_name=None):
 """
     Verify an El Gamal signature of a message (string) or a file
     using the public key
+
+    > digest : hash_message(message), when already computed
 """
 
 
-def check_El_Gamal_Signature(p, alpha, h, signature, message=None, file_name=None):
-    if message == None and file_name == None:
+def check_El_Gamal_Signature(p, alpha, h, signature, message=None, file_name=None, digest=None):
+    if message == None and file_name == None and digest == None:
         print("error : please enter a message or a filname to sign")
 
     s_1 = signature[0]
@@ -74,13 +98,11 @@ def check_El_Gamal_Signature(p, alpha, h, signature, message=None, file_name=Non
         with open(file_name, "r") as file:
             message = file.read()
 
-    h_M = sponge_hash(message.encode(), hash_length_bytes=32)
-    h_M = int.from_bytes(h_M, "little")
+    h_M = hash_message(message) if digest == None else digest
 
-    test_1 = (tools.fast_exponentiation(h, s_1, mod=p) *
-              tools.fast_exponentiation(s_1, s_2, mod=p)) % p
+    test_1 = tools.multi_exponentiation([h, s_1], [s_1, s_2], p)
 
-    test_2 = tools.fast_exponentiation(alpha, h_M, mod=p)
+    test_2 = fixed_base_modexp(alpha, h_M, p)
 
     if test_1 == test_2:
         return True
@@ -89,18 +111,33 @@ def check_El_Gamal_Signature(p, alpha, h, signature, message=None, file_name=Non
 
 # =====================  RSA Signature   ==================================
 
+# public exponent of the fast verification key profile
+RSA_PUBLIC_EXPONENT = 65537
+
+# private key entries used to sign with the chinese remainder theorem
+RSA_CRT_KEYS = ("p", "q", "dP", "dQ", "qInv")
+
 
 """
     Initialization of RSA signature
     Public Key : n , e
     Private Key : d
+
+    > public_exponent : fixed e (RSA_PUBLIC_EXPONENT : cheap verification),
+        a random 512 bits prime e is chosen when None
 """
 
 
-def init_RSA_Signature(p, q):
+def init_RSA_Signature(p, q, public_exponent=None):
     phi = (p-1)*(q-1)
     n = p * q
 
+    if public_exponent is not None:
+        g, _, d = tools.PGCD_bezout(public_exponent, phi)
+        if g != 1:
+            raise ValueError("the public exponent is not invertible mod phi(n)")
+        return n, public_exponent, d % phi
+
     e = tools.random_512_bits_integer()
     if e % 2 == 0:
         e = e+1
@@ -123,14 +160,40 @@ def init_RSA_Signature(p, q):
     return n, e, d
 
 
+"""
+    Chinese remainder theorem parameters of the RSA private key :
+    dP = d mod p-1, dQ = d mod q-1, qInv = q^-1 mod p
+"""
+
+
+def init_RSA_CRT_parameters(p, q, d):
+    return d % (p-1), d % (q-1), tools.modular_inverse(q, p)
+
+
+"""
+    Returns the (p, q, dP, dQ, qInv) parameters of a private key dictionnary,
+    None for the keys generated without them (n, e, d only)
+"""
+
+
+def get_RSA_CRT_parameters(private_key):
+    if not all(key in private_key for key in RSA_CRT_KEYS):
+        return None
+    return tuple(private_key[key] for key in RSA_CRT_KEYS)
+
+
 """
     RSA Signature of a file or a message (string)
     using spongeHash function
+
+    > crt : (p, q, dP, dQ, qInv), two half size exponentiations
+        recombined with Garner's formula instead of one with d
+    > digest : hash_message(message), when already computed
 """
 
 
-def RSA_Signature(n, d, message=None, file_name=None):
-    if message == None and file_name == None:
+def RSA_Signature(n, d, message=None, file_name=None, crt=None, digest=None):
+    if message == None and file_name == None and digest == None:
         print("error : please enter a message or a filname to sign")
         return 0
 
@@ -138,20 +201,27 @@ def RSA_Signature(n, d, message=None, file_name=None):
         with open(file_name, "r") as file:
             message = file.read()
 
-    h_M = sponge_hash(message.encode(), hash_length_bytes=32)
-    h_M = int.from_bytes(h_M, "little")
+    h_M = hash_message(message) if digest == None else digest
+
+    if crt is None:
+        return modexp(h_M, d, n)
 
-    signature = tools.fast_exponentiation(h_M, d, mod=n)
+    p, q, d_p, d_q, q_inv = crt
+    m_1 = modexp(h_M, d_p, p)
+    m_2 = modexp(h_M, d_q, q)
+    signature = m_2 + (q_inv * (m_1 - m_2) % p) * q
     return signature
 
 
 """
     Check RSA Signature of a file or mesage using the public key
+
+    > digest : hash_message(message), when already computed
 """
 
 
-def check_RSA_signature(e, n, signature, message=None, file_name=None):
-    if message == None and file_name == None:
+def check_RSA_signature(e, n, signature, message=None, file_name=None, digest=None):
+    if message == None and file_name == None and digest == None:
         print("error : please enter a message or a filname to check")
         return 0
 
@@ -159,29 +229,90 @@ def check_RSA_signature(e, n, signature, message=None, file_name=None):
         with open(file_name, "r") as file:
             message = file.read()
 
-    h_M = sponge_hash(message.encode(), hash_length_bytes=32)
-    h_M = int.from_bytes(h_M, "little")
+    h_M = hash_message(message) if digest == None else digest
 
-    test = tools.fast_exponentiation(signature, e, mod=n)
+    test = modexp(signature, e, n)
 
     if test == h_M:
         return True
     else:
         return False
 
+# =====================  Batch verification  ==============================
+
+
+# returns the hashes (as integers) of the messages, as signed by El Gamal and RSA
+def hash_messages(messages):
+    hashes = sponge_hash_many([message.encode() for message in messages], hash_length_bytes=32)
+    return [int.from_bytes(h_M, "little") for h_M in hashes]
+
+
+"""
+    Verify El Gamal signatures of messages (strings) of the same public key
+    at once, p = 2q + 1 safe prime :
+
+        : sign : Z_p* = {1, -1} x quadratic residues, (-1 / p) = -1,
+            the Legendre symbols of both sides are checked for every
+            signature : (h / p)^s_1i * (s_1i / p)^s_2i == (alpha / p)^h_Mi
+        : quadratic residues (prime order q) : small exponents test of the
+            squares of both sides, with random r_i,
+            h ^ (sum 2 r_i s_1i) * prod s_1i ^ (2 r_i s_2i) == alpha ^ (sum 2 r_i h_Mi)
+
+    > False when at least one signature is wrong (with probability
+        1 - 2^-BATCH_SECURITY_BITS), the faulty ones are not identified
+    > the signatures are checked one by one when p is not a safe prime
+        with p = 3 mod 4 (the sign of a side could go unnoticed)
+    > digests : hash_messages(messages), when already computed
+"""
+
+
+def check_El_Gamal_Signature_batch(p, alpha, h, signatures, messages=None, digests=None):
+    if digests is None:
+        digests = hash_messages(messages)
+
+    legendre_h = tools.jacobi_symbol(h, p)
+    legendre_alpha = tools.jacobi_symbol(alpha, p)
+
+    # the exponents are reduced mod p-1, every s_1 must be in Z_p*
+    if p % 4 != 3 or legendre_h == 0 or legendre_alpha == 0 or \
+            not all(0 < signature[0] < p for signature in signatures) or \
+            not (tools.fermat_test(p) and tools.fermat_test((p-1) // 2)):
+        return all(check_El_Gamal_Signature(p, alpha, h, signature, digest=h_M)
+                   for signature, h_M in zip(signatures, digests))
+
+    h_exponent = 0
+    alpha_exponent = 0
+    test_1 = 1
+    for (s_1, s_2), h_M in zip(signatures, digests):
+        # symbols of +-1 : only the parity of the exponents matters
+        sign_1 = (legendre_h if s_1 % 2 else 1) * (tools.jacobi_symbol(s_1, p) if s_2 % 2 else 1)
+        sign_2 = legendre_alpha if h_M % 2 else 1
+        if sign_1 != sign_2:
+            return False
+
+        r = 2 * random.getrandbits(BATCH_SECURITY_BITS)
+        h_exponent = h_exponent + r * s_1
+        alpha_exponent = alpha_exponent + r * h_M
+        test_1 = test_1 * modexp(s_1, r * s_2 % (p-1), p) % p
+
+    test_1 = test_1 * modexp(h, h_exponent % (p-1), p) % p
+    test_2 = fixed_base_modexp(alpha, alpha_exponent % (p-1), p)
+    return test_1 == test_2
+
 # ======================  Diffie Hellman   =================================
 
 
 """
     First step of Diffie Hellman protocol :
     : p : big prime number of 512 bits
+    : table_file : the fixed base table of alpha is saved to this file
 """
 
 
-def diffie_hellman_step_1(p):
-    alpha = tools.find_generator(p)
+def diffie_hellman_step_1(p, table_file=None):
+    _, __, alpha = tools.group_parameters(p)
     r = random.randint(1, p-1)
-    A = tools.fast_exponentiation(alpha, r, mod=p)
+    A = fixed_base_table(alpha, p, table_file).power(r)
     return p, alpha, A, r
 
 
@@ -193,8 +324,8 @@ def diffie_hellman_step_1(p):
 
 def diffie_hellman_step_2(p, alpha, A):
     s = random.randint(1, p-1)
-    B = tools.fast_exponentiation(alpha, s, mod=p)
-    secret = tools.fast_exponentiation(A, s, mod=p)
+    B = fixed_base_modexp(alpha, s, p)
+    secret = modexp(A, s, p)
     return secret, B
 
 
@@ -205,5 +336,5 @@ def diffie_hellman_step_2(p, alpha, A):
 
 
 def diffie_hellman_step_3(B, r, p):
-    secret = tools.fast_exponentiation(B, r, mod=p)
+    secret = modexp(B, r, p)
     return secret
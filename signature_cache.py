@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+"""
+    LRU cache of the verified signatures : a signature of a recorded
+    transaction can not change, it is only verified once
+
+        : key : sha256 of (signer public key, message digest, signature),
+            the message digest is the hash signed by El Gamal and RSA
+        : only the successful verifications are recorded
+        : the least recently used keys are evicted above 'max_entries'
+            entries or 'max_bytes' bytes (None : no limit)
+        : persistence : the keys, least recently used first,
+            concatenated in a file
+"""
+
+CACHE_MAX_ENTRIES = 100000
+CACHE_KEY_SIZE = 32
+# memory used by an OrderedDict entry, besides its key
+CACHE_ENTRY_OVERHEAD = 100
+
+CACHE_FILE_SUFFIX = "_signature_cache"
+
+
+# returns the cache key of the signature of the message of digest 'message_digest' by 'signer'
+def cache_key(signer, message_digest, signature):
+    return hashlib.sha256(json.dumps([signer, message_digest, signature]).encode()).digest()
+
+
+class VerifiedSignatureCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    # returns true if the signature was already verified
+    def contains(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits = self.hits + 1
+                return True
+            self.misses = self.misses + 1
+            return False
+
+    # records a successful verification
+    def add(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = None
+            self.size_bytes = self.size_bytes + sys.getsizeof(key) + CACHE_ENTRY_OVERHEAD
+            self.evict()
+
+    def evict(self):
+        while self.entries and ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                                (self.max_bytes is not None and self.size_bytes > self.max_bytes)):
+            key, _ = self.entries.popitem(last=False)
+            self.size_bytes = self.size_bytes - sys.getsizeof(key) - CACHE_ENTRY_OVERHEAD
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size_bytes, "hits": self.hits, "misses": self.misses}
+
+    def save(self, file_name):
+        with self.lock:
+            data = b"".join(self.entries)
+        # unique temporary file : concurrent saves never write the same file
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(file_name)),
+                                         prefix=os.path.basename(file_name) + ".", delete=False) as file:
+            file.write(data)
+        os.replace(file.name, file_name)
+
+    # adds the keys saved in 'file_name', returns false if there is no (valid) file
+    def load(self, file_name):
+        try:
+            with open(file_name, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        if len(data) % CACHE_KEY_SIZE != 0:
+            return False
+        for position in range(0, len(data), CACHE_KEY_SIZE):
+            self.add(data[position:position + CACHE_KEY_SIZE])
+        return True
+
+
+# cache shared by every verification of the process
+verified_signatures = VerifiedSignatureCache()
@@ -1,49 +1,183 @@
-from bitstring import BitArray
+import numpy as np
 from rc4 import rc4
 
+"""
+    Sponge hash built on a RC4-based bit permutation.
+
+    The state is handled as numpy byte arrays : a permutation unpacks the
+    state to a bit array, gathers it with the RC4 permutation as index
+    vector and packs it back to bytes.
+"""
+
+SEED = 'Lucien&IrénéeLesBests'.encode()
+
+# under this number of inputs of the same padded length, they are hashed one by one
+MIN_BATCH_SIZE = 24
+
 
 # returns a 'hash_length_bytes' long hash of given bytearray 'data'
-def sponge_hash(data: bytes, hash_length_bytes=8, absorb_iterations=1, squish_iterations=3, seed = 'Lucien&IrénéeLesBests'.encode()):
-    bit_data = BitArray(bytes=data)
-    bit_data.append(seed)
+def sponge_hash(data: bytes, hash_length_bytes=8, absorb_iterations=1, squish_iterations=3, seed=SEED):
+    return SpongeHasher(data, hash_length_bytes, absorb_iterations, squish_iterations, seed).digest()
+
+
+# returns the hashes of every bytes of 'data_list', in the same order
+# (inputs of the same padded length are hashed in lockstep)
+def sponge_hash_many(data_list, hash_length_bytes=8, absorb_iterations=1, squish_iterations=3, seed=SEED):
+    return SpongeHasher(b"", hash_length_bytes, absorb_iterations, squish_iterations, seed).digest_many(data_list)
+
+
+"""
+    Incremental sponge hash, hashlib style :
+        : update() absorbs every complete block of the given data
+            (without absorb iterations, the data is squished as it is :
+            it is kept until digest())
+        : copy() clones the midstate (absorbed state and pending bytes)
+        : digest() returns the same hash as sponge_hash on all the given data
+"""
+
+
+class SpongeHasher:
+    def __init__(self, data=b"", hash_length_bytes=8, absorb_iterations=1, squish_iterations=3, seed=SEED):
+        self.hash_length_bytes = hash_length_bytes
+        self.absorb_iterations = absorb_iterations
+        self.squish_iterations = squish_iterations
+        self.seed = bytes(seed)
+        self.state = initial_state(hash_length_bytes * 8)
+        self.pending = b""
+        self.update(data)
+
+    def update(self, data):
+        pending = self.pending + bytes(data)
+        absorbed_len = 0
+        if self.absorb_iterations > 0:
+            absorbed_len = len(pending) - len(pending) % self.hash_length_bytes
+        self.state = absorb_blocks(self.state, np.frombuffer(pending, dtype=np.uint8, count=absorbed_len))
+        self.pending = pending[absorbed_len:]
+
+    def copy(self):
+        # the state arrays are never modified in place, they can be shared
+        clone = SpongeHasher.__new__(SpongeHasher)
+        clone.__dict__.update(self.__dict__)
+        return clone
+
+    def digest(self):
+        byte_data = np.frombuffer(self.pending + self.seed, dtype=np.uint8)
+        if self.absorb_iterations > 0:
+            byte_data = absorb_blocks(self.state, pad(byte_data, self.hash_length_bytes))
+
+        # absorb
+        for _ in range(self.absorb_iterations - 1):
+            byte_data = absorb(byte_data, self.hash_length_bytes * 8, 2 * self.hash_length_bytes)
+
+        # squish
+        for _ in range(self.squish_iterations):
+            byte_data = rc4_permutation(byte_data)
+        return byte_data[:self.hash_length_bytes].tobytes()
+
+    def hexdigest(self):
+        return self.digest().hex()
 
-    # absorb
-    for _ in range(absorb_iterations):
-        bit_data = absorb(bit_data, hash_length_bytes * 8, 2 * hash_length_bytes)
+    # returns the digests the hasher would give after being updated with each bytes of 'data_list'
+    def digest_many(self, data_list):
+        digests = [None] * len(data_list)
+        groups = {}
+        for index, data in enumerate(data_list):
+            padded_len = len(self.pending) + len(data) + len(self.seed)
+            if self.absorb_iterations > 0:
+                padded_len = padded_len // self.hash_length_bytes
+            groups.setdefault(padded_len, []).append(index)
 
-    # squish
-    for _ in range(squish_iterations):
-        bit_data = rc4_permutation(bit_data)
-    return bit_data[:hash_length_bytes * 8].bytes
+        for indexes in groups.values():
+            if len(indexes) < MIN_BATCH_SIZE:
+                for index in indexes:
+                    hasher = self.copy()
+                    hasher.update(data_list[index])
+                    digests[index] = hasher.digest()
+                continue
+
+            byte_data = [np.frombuffer(self.pending + bytes(data_list[index]) + self.seed, dtype=np.uint8)
+                         for index in indexes]
+            if self.absorb_iterations > 0:
+                byte_data = np.stack([pad(row, self.hash_length_bytes) for row in byte_data])
+                states = absorb_blocks_many(np.tile(self.state, (len(indexes), 1)), byte_data)
+            else:
+                states = np.stack(byte_data)
+
+            # absorb
+            for _ in range(self.absorb_iterations - 1):
+                states = absorb_blocks_many(np.tile(initial_state(self.hash_length_bytes * 8), (len(indexes), 1)),
+                                            pad_many(states, self.hash_length_bytes))
+
+            # squish
+            for _ in range(self.squish_iterations):
+                states = rc4_permutation_many(states)
+
+            for index, state in zip(indexes, states):
+                digests[index] = state[:self.hash_length_bytes].tobytes()
+        return digests
 
 
 # First step of sponge hashing
-def absorb(bit_data: BitArray, bitrate, byte_capacity):
-    state = BitArray('uint:' + str(int(byte_capacity / 8)) + '=0')
-    padded_bits = pad(bit_data, bitrate)
-    number_of_blocks = int(padded_bits.len / bitrate)
-    state[:bitrate] = BitArray('uint:' + str(bitrate) + '=' + str(bitrate))
-
-    for i in range(number_of_blocks):
-        position = bitrate * i
-        block = BitArray(bin=padded_bits.bin[position:position + bitrate])
-        state[:bitrate] = state[:bitrate] ^ block
-        state = rc4_permutation(state)
+# (the capacity is always smaller than the bitrate : the state is 'bitrate' bits long)
+def absorb(byte_data, bitrate, byte_capacity):
+    return absorb_blocks(initial_state(bitrate), pad(byte_data, bitrate // 8))
+
+
+# absorbs the given aligned bytes into the state, one 'len(state)' bytes block at a time
+def absorb_blocks(state, byte_data):
+    for block in byte_data.reshape(-1, len(state)):
+        state = rc4_permutation(state ^ block)
     return state
 
 
-# RC4-based PRP
-def rc4_permutation(bitarray):
-    permutation_len = len(bitarray)
-    permutation_list = rc4(bitarray.bytes, state_len=len(bitarray)).get_permutation_list()
-    output_data = BitArray()
+# 2-D absorb_blocks : absorbs each row of 'byte_data' into the matching row of 'states'
+def absorb_blocks_many(states, byte_data):
+    byte_rate = states.shape[1]
+    for position in range(0, byte_data.shape[1], byte_rate):
+        states = rc4_permutation_many(states ^ byte_data[:, position:position + byte_rate])
+    return states
+
+
+# returns the sponge state before absorption : 'bitrate' encoded on 'bitrate' bits
+def initial_state(bitrate):
+    return np.frombuffer(bitrate.to_bytes(bitrate // 8, "big"), dtype=np.uint8)
+
+
+# RC4-based PRP, the RC4 state keyed with the data is used as bit index vector
+def rc4_permutation(byte_data):
+    permutation_list = rc4(byte_data.tobytes(), state_len=8 * len(byte_data)).get_permutation_list()
+    bits = np.unpackbits(byte_data)
+    return np.packbits(bits[np.asarray(permutation_list)])
+
+
+# 2-D rc4_permutation : the RC4 key schedules of all the rows run in lockstep
+def rc4_permutation_many(byte_data):
+    number_of_rows, key_len = byte_data.shape
+    permutation_len = 8 * key_len
+    rows = np.arange(number_of_rows)
+    keys = byte_data.astype(np.intp)
+    S = np.tile(np.arange(permutation_len), (number_of_rows, 1))
+    j = np.zeros(number_of_rows, dtype=np.intp)
+
     for i in range(permutation_len):
-        output_data.append(BitArray(bin=bitarray.bin[permutation_list[i]]))
-    return output_data
+        j = (j + S[:, i] + keys[:, i % key_len]) % permutation_len
+        S_i = S[:, i].copy()
+        S[:, i] = S[rows, j]
+        S[rows, j] = S_i
+
+    bits = np.unpackbits(byte_data, axis=1)
+    return np.packbits(np.take_along_axis(bits, S, axis=1), axis=1)
+
+
+# Pads the given bytes 'byte_data' to ensure 'len(byte_data) % byte_rate == 0'
+# (a whole block of zeros is added when the data is already aligned)
+def pad(byte_data, byte_rate):
+    last_block_len = len(byte_data) % byte_rate
+    return np.concatenate((byte_data, np.zeros(byte_rate - last_block_len, dtype=np.uint8)))
 
 
-# Pads the given Bitarray 'bits' to ensure 'bits.len % bitrate == 0'
-def pad(bits, bitrate):
-    last_block_len = bits.len % bitrate
-    bits.append('uint:' + str(bitrate - last_block_len) + '=0')
-    return bits
\ No newline at end of file
+# 2-D pad, every row of 'byte_data' has the same length
+def pad_many(byte_data, byte_rate):
+    last_block_len = byte_data.shape[1] % byte_rate
+    padding = np.zeros((byte_data.shape[0], byte_rate - last_block_len), dtype=np.uint8)
+    return np.concatenate((byte_data, padding), axis=1)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# the modules of the project are at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import tools  # noqa: E402
+
+
+"""
+    Loads a safe prime file of the repository, the group parameters sidecar
+    file is written next to a copy of it in a temporary directory
+"""
+
+
+@pytest.fixture(scope="session")
+def safe_prime(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("safe_primes")
+
+    def load(file_name):
+        shutil.copy(os.path.join(ROOT, file_name), directory / file_name)
+        return tools.load_safe_prime(str(directory / file_name))
+    return load
+
+
+"""
+    The tests run in a temporary working directory : the files the modules
+    create in the working directory (gf_16_inverse_table) stay out of the
+    repository
+"""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def working_directory(tmp_path_factory):
+    previous_directory = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("working_directory"))
+    yield
+    os.chdir(previous_directory)
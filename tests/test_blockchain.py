@@ -0,0 +1,85 @@
+import json
+import os
+from threading import Thread
+
+import pytest
+
+from blockchain import Blockchain, Transaction, get_user_public_key
+from signature import init_El_Gamal_Signature
+from signature_cache import verified_signatures
+
+"""
+    Chain verification : a chain holding a wrong signature is not verified,
+    and its checkpoint is not advanced
+"""
+
+
+@pytest.fixture(scope="module")
+def chain_file(safe_prime, tmp_path_factory):
+    p, alpha, h, x = init_El_Gamal_Signature(safe_prime("alice_safe_512_prime_1"))
+    key = {'p': p, 'alpha': alpha, 'h': h, 'x': x, 'signature_type': 'El_gamal'}
+    blockchain = Blockchain()
+    for value in range(7):
+        transaction = Transaction(get_user_public_key(key), value, 1.0)
+        transaction.sign(key)
+        blockchain.add_transaction(transaction)
+    file_path = str(tmp_path_factory.mktemp("chain") / "chain")
+    blockchain.save(file_path)
+    return file_path
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    verified_signatures.clear()
+    yield
+    verified_signatures.clear()
+
+
+def test_checkpoint(chain_file, tmp_path):
+    file_path = str(tmp_path / "chain")
+    with open(chain_file, "r") as read_file, open(file_path, "w") as write_file:
+        write_file.write(read_file.read())
+
+    blockchain = Blockchain.load(file_path)
+    assert blockchain.verify()
+    assert blockchain.load_checkpoint() == (len(blockchain.chain) - 2, blockchain.chain[-1].previous_hash)
+
+
+def test_wrong_signature_is_not_checkpointed(chain_file, tmp_path):
+    with open(chain_file, "r") as read_file:
+        data = json.load(read_file)
+    signature = data['chain'][-1]['transactions'][0]['signature']
+    signature['signature'][1] = signature['signature'][1] + 1
+    file_path = str(tmp_path / "chain")
+    with open(file_path, "w") as write_file:
+        json.dump(data, write_file)
+
+    blockchain = Blockchain.load(file_path)
+    assert not blockchain.verify()
+    assert blockchain.load_checkpoint() is None
+
+
+# the server verifies the chain from concurrent threads
+def test_concurrent_checkpoints(chain_file, tmp_path):
+    file_path = str(tmp_path / "chain")
+    with open(chain_file, "r") as read_file, open(file_path, "w") as write_file:
+        write_file.write(read_file.read())
+    blockchain = Blockchain.load(file_path)
+    number, block_hash = len(blockchain.chain) - 2, blockchain.chain[-1].previous_hash
+    errors = []
+
+    def save():
+        try:
+            for _ in range(50):
+                blockchain.save_checkpoint(number, block_hash)
+        except OSError as error:
+            errors.append(error)
+
+    threads = [Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert blockchain.load_checkpoint() == (number, block_hash)
+    assert sorted(os.listdir(tmp_path)) == ["chain", "chain_checkpoint"]
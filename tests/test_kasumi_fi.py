@@ -0,0 +1,54 @@
+import pytest
+
+import kasumi
+
+"""
+    Property test of the fused FI tables : for every 16 bits z and several
+    sub keys y, the fused 16 bits S_box FI and the combined FI tables give
+    the same value as the original FI with two 8 bits S_boxes
+"""
+
+
+def reference_FI(cipher, y, z):
+    z_bytes = z.to_bytes(2, "little")
+    z_1 = cipher.s_box_1[z_bytes[0]]
+    z_2 = cipher.s_box_2[z_bytes[1]]
+    z = int.from_bytes(z_1.to_bytes(1, "little") + z_2.to_bytes(1, "little"), "little")
+    return cipher.right_shift(y, 2, nb_bits=8) ^ z
+
+
+def sub_keys(cipher):
+    key, modified_key = cipher.generate_keys()
+    round_keys = cipher.key_schedule(key, modified_key).rounds
+    return [0, 1, 2, 3, 0xFF, 0x100, 0xFFFF] + [KI for keys in round_keys[:2] for KI in keys[5:8]]
+
+
+@pytest.fixture(scope="module", params=["LucienD&IreneeD)", "another rc4 key"])
+def ciphers(request):
+    fused = kasumi.Kasumi(rc4_input_key=request.param)
+    combined = kasumi.Kasumi(rc4_input_key=request.param, combined_fi_tables=True)
+    yield fused, combined
+    fused.close()
+    combined.close()
+
+
+def test_s_box_16(ciphers):
+    fused, _ = ciphers
+    assert fused.s_box_16 == kasumi.build_s_box_16(fused.s_box_1, fused.s_box_2)
+    for z in range(1 << 16):
+        assert fused.s_box_16[z] == fused.s_box_1[z & 0xFF] | fused.s_box_2[z >> 8] << 8
+
+
+def test_fused_FI(ciphers):
+    fused, _ = ciphers
+    for y in sub_keys(fused):
+        for z in range(1 << 16):
+            assert fused.FI(y, z) == reference_FI(fused, y, z)
+
+
+def test_fi_tables(ciphers):
+    for cipher in ciphers:
+        for y in sub_keys(cipher):
+            table, constant = cipher.fi_table(y)
+            for z in range(1 << 16):
+                assert table[z] ^ constant == reference_FI(cipher, y, z)
@@ -0,0 +1,36 @@
+import pytest
+
+from rc4 import rc4
+
+"""
+    The RC4 state is a bytearray or an array of 16 or 32 bits words
+    depending on its length : it gives the same permutation and output
+    as the original list state, for every state length
+"""
+
+
+# original list based RC4 : key schedule and 'length' output values
+def reference_rc4(key, state_len, length):
+    S = list(range(state_len))
+    j = 0
+    for i in range(state_len):
+        j = (j + S[i] + key[i % len(key)]) % state_len
+        S[i], S[j] = S[j], S[i]
+    permutation = list(S)
+
+    output = []
+    x = y = 0
+    for _ in range(length):
+        x = (x + 1) % state_len
+        y = (y + S[x]) % state_len
+        S[x], S[y] = S[y], S[x]
+        output.append(S[(S[x] + S[y]) % state_len])
+    return permutation, output
+
+
+@pytest.mark.parametrize("state_len", [16, 256, 257, 4096, 1 << 16, (1 << 16) + 1, 1 << 17])
+def test_state_lengths(state_len):
+    key = bytes(range(7, 200, 3))
+    permutation, output = reference_rc4(key, state_len, 1000)
+    assert list(rc4(key, state_len=state_len).get_permutation_list()) == permutation
+    assert rc4(key, state_len=state_len).get_bytes(1000) == output
@@ -0,0 +1,137 @@
+import random
+
+import pytest
+
+import tools
+from blockchain import Transaction, verify_batch
+from signature import El_Gamal_Signature, check_El_Gamal_Signature, check_El_Gamal_Signature_batch, \
+    init_El_Gamal_Signature, init_RSA_Signature
+from signature_cache import verified_signatures
+
+"""
+    Batch verification : a batch holding signatures that fail one by one
+    must fail, including when their -1 factors would cancel by pairs
+"""
+
+MESSAGES = ["message %d" % i for i in range(8)]
+
+
+"""
+    Nonce pool of the nonces y = 3, 5, 7... : alpha is a generator,
+    s_1 = alpha ^ y is a non residue for every odd y
+"""
+
+
+class OddNonces:
+    def __init__(self, p, alpha):
+        self.p = p
+        self.alpha = alpha
+        self.y = 1
+
+    def pop(self):
+        self.y = self.y + 2
+        return self.y, pow(self.alpha, self.y, self.p), tools.modular_inverse(self.y, self.p - 1)
+
+
+@pytest.fixture(scope="module")
+def el_gamal_key(safe_prime):
+    return init_El_Gamal_Signature(safe_prime("alice_safe_512_prime_1"))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    verified_signatures.clear()
+    yield
+    verified_signatures.clear()
+
+
+def legendre_symbol(a, p):
+    a = a % p
+    return 0 if a == 0 else 1 if pow(a, (p - 1) // 2, p) == 1 else -1
+
+
+def test_jacobi_symbol(safe_prime):
+    # (a / n) is the product of the Legendre symbols of the prime factors of n
+    for factors in ([3], [5], [7], [3, 3], [3, 5], [3, 7, 7], [1019], [3, 5, 7, 11]):
+        n = 1
+        for factor in factors:
+            n = n * factor
+        for a in range(-2 * n, 2 * n):
+            expected = 1
+            for factor in factors:
+                expected = expected * legendre_symbol(a, factor)
+            assert tools.jacobi_symbol(a, n) == expected
+
+    p = safe_prime("alice_safe_512_prime_1")
+    for _ in range(50):
+        a = random.randint(1, p - 1)
+        assert tools.jacobi_symbol(a, p) == legendre_symbol(a, p)
+
+
+def test_el_gamal_batch(el_gamal_key):
+    p, alpha, h, x = el_gamal_key
+    signatures = [El_Gamal_Signature(p, alpha, h, x, message=message) for message in MESSAGES]
+    assert check_El_Gamal_Signature_batch(p, alpha, h, signatures, MESSAGES)
+
+    wrong = [list(signature) for signature in signatures]
+    wrong[3][1] = wrong[3][1] + 1
+    assert not check_El_Gamal_Signature_batch(p, alpha, h, wrong, MESSAGES)
+
+
+def test_el_gamal_batch_pair_of_minus_one(el_gamal_key):
+    p, alpha, h, x = el_gamal_key
+    q = (p - 1) // 2
+    nonces = OddNonces(p, alpha)
+    signatures = [El_Gamal_Signature(p, alpha, h, x, message=message, nonce_pool=nonces) for message in MESSAGES]
+    assert check_El_Gamal_Signature_batch(p, alpha, h, signatures, MESSAGES)
+    # s_1 ^ q = -1 for a non residue s_1 : s_2 + q flips the sign of the left side
+    for index in (2, 5):
+        assert tools.jacobi_symbol(signatures[index][0], p) == -1
+        signatures[index] = [signatures[index][0], (signatures[index][1] + q) % (p - 1)]
+        assert not check_El_Gamal_Signature(p, alpha, h, signatures[index], MESSAGES[index])
+    for _ in range(10):
+        assert not check_El_Gamal_Signature_batch(p, alpha, h, signatures, MESSAGES)
+
+
+def test_verify_batch_rsa_pair_of_minus_one(safe_prime):
+    n, e, d = init_RSA_Signature(safe_prime("alice_safe_512_prime_1"), safe_prime("alice_safe_512_prime_2"))
+    transactions = []
+    for message_index in range(4):
+        transaction = Transaction("alice", "bob", message_index + 1)
+        transaction.sign({'n': n, 'e': e, 'd': d}, signature_type='RSA')
+        transactions.append(transaction)
+
+    # s ^ e = -h_M for n - s with e odd, the pair would cancel in a product
+    for index in (0, 1):
+        data = transactions[index].serialize()
+        data['signature'] = dict(data['signature'], signature=n - data['signature']['signature'])
+        transactions[index] = Transaction.deserialize(data)
+
+    assert verify_batch(transactions) == [False, False, True, True]
+    assert not transactions[0].verify() and not transactions[1].verify()
+
+
+def test_verify_batch_caches_the_valid_signatures_only(el_gamal_key):
+    p, alpha, h, x = el_gamal_key
+    q = (p - 1) // 2
+    nonces = OddNonces(p, alpha)
+    transactions = []
+    for message_index in range(8):
+        transaction = Transaction("alice", "bob", message_index + 1)
+        transaction.sign({'p': p, 'alpha': alpha, 'h': h, 'x': x}, nonce_pool=nonces)
+        transactions.append(transaction)
+
+    wrong = (2, 5)
+    for index in wrong:
+        assert tools.jacobi_symbol(transactions[index].signature['signature'][0], p) == -1
+        data = transactions[index].serialize()
+        s_1, s_2 = data['signature']['signature']
+        data['signature'] = dict(data['signature'], signature=[s_1, (s_2 + q) % (p - 1)])
+        transactions[index] = Transaction.deserialize(data)
+
+    results = verify_batch(transactions)
+    assert results == [index not in wrong for index in range(len(transactions))]
+    assert len(verified_signatures) == len(transactions) - len(wrong)
+    for index, transaction in enumerate(transactions):
+        assert verified_signatures.contains(transaction.cache_key()) == (index not in wrong)
+
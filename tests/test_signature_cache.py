@@ -0,0 +1,54 @@
+import os
+from threading import Thread
+
+from signature_cache import CACHE_KEY_SIZE, VerifiedSignatureCache
+
+"""
+    Persistence of the verified signatures cache
+"""
+
+
+def test_save_load(tmp_path):
+    cache = VerifiedSignatureCache()
+    keys = [bytes([i]) * CACHE_KEY_SIZE for i in range(5)]
+    for key in keys:
+        cache.add(key)
+    file_name = str(tmp_path / "cache")
+    cache.save(file_name)
+
+    loaded = VerifiedSignatureCache()
+    assert loaded.load(file_name)
+    assert list(loaded.entries) == keys
+    assert os.listdir(tmp_path) == ["cache"]
+
+
+# the server saves the cache after each /verify, from concurrent threads
+def test_concurrent_saves(tmp_path):
+    file_name = str(tmp_path / "cache")
+    caches = []
+    for thread_index in range(8):
+        cache = VerifiedSignatureCache()
+        for i in range(2000):
+            cache.add(bytes([thread_index]) * 2 + i.to_bytes(CACHE_KEY_SIZE - 2, "big"))
+        caches.append(cache)
+
+    errors = []
+
+    def save(cache):
+        try:
+            for _ in range(20):
+                cache.save(file_name)
+        except OSError as error:
+            errors.append(error)
+
+    threads = [Thread(target=save, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    loaded = VerifiedSignatureCache()
+    assert loaded.load(file_name)
+    assert any(list(loaded.entries) == list(cache.entries) for cache in caches)
+    assert os.listdir(tmp_path) == ["cache"]
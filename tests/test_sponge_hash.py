@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+import spongeHash
+from spongeHash import SEED, SpongeHasher, sponge_hash, sponge_hash_many
+
+"""
+    Known answer tests of the sponge hash : the vectors were generated with
+    the original bitstring implementation, for every combination of
+    hash_length_bytes (1, 2, 3, 4, 5, 8, 13, 16, 31, 32), absorb_iterations
+    (0 to 3) and squish_iterations (0, 1, 3), and a few with another seed
+"""
+
+with open(os.path.join(os.path.dirname(__file__), "sponge_hash_vectors.json"), "r") as file:
+    VECTORS = json.load(file)
+
+
+def vector_arguments(vector):
+    seed = bytes.fromhex(vector["seed"]) if "seed" in vector else SEED
+    return vector["hash_length_bytes"], vector["absorb_iterations"], vector["squish_iterations"], seed
+
+
+def vector_id(vector):
+    return "-".join(str(value) for value in (vector["hash_length_bytes"], vector["absorb_iterations"],
+                                             vector["squish_iterations"], len(vector["data"]) // 2,
+                                             vector.get("seed", "")))
+
+
+@pytest.mark.parametrize("vector", VECTORS, ids=vector_id)
+def test_sponge_hash(vector):
+    data = bytes.fromhex(vector["data"])
+    assert sponge_hash(data, *vector_arguments(vector)).hex() == vector["digest"]
+
+
+@pytest.mark.parametrize("vector", VECTORS, ids=vector_id)
+def test_sponge_hasher_updates(vector):
+    data = bytes.fromhex(vector["data"])
+    hasher = SpongeHasher(b"", *vector_arguments(vector))
+    for position in range(0, len(data), 5):
+        hasher.update(data[position:position + 5])
+    assert hasher.copy().hexdigest() == vector["digest"]
+    assert hasher.hexdigest() == vector["digest"]
+
+
+# every group of inputs of the same parameters is hashed in lockstep
+@pytest.mark.parametrize("min_batch_size", [1, spongeHash.MIN_BATCH_SIZE])
+def test_sponge_hash_many(monkeypatch, min_batch_size):
+    monkeypatch.setattr(spongeHash, "MIN_BATCH_SIZE", min_batch_size)
+    groups = {}
+    for vector in VECTORS:
+        groups.setdefault(vector_arguments(vector), []).append(vector)
+
+    for arguments, vectors in groups.items():
+        digests = sponge_hash_many([bytes.fromhex(vector["data"]) for vector in vectors], *arguments)
+        assert [digest.hex() for digest in digests] == [vector["digest"] for vector in vectors]
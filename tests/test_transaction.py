@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from blockchain import Transaction
+from signature import init_El_Gamal_Signature
+
+"""
+    A signed transaction can not be modified, including its signature :
+    its cached encodings (to_json, message digest) stay valid
+"""
+
+
+@pytest.fixture(scope="module")
+def signed_transaction(safe_prime):
+    p, alpha, h, x = init_El_Gamal_Signature(safe_prime("alice_safe_512_prime_1"))
+    transaction = Transaction(p + alpha + h, 7, 2.5)
+    transaction.sign({'p': p, 'alpha': alpha, 'h': h, 'x': x})
+    return transaction
+
+
+def test_signed_attributes_are_frozen(signed_transaction):
+    for name in ('debit_user_public_key', 'credit_user_public_key', 'transaction_value', 'signature'):
+        with pytest.raises(AttributeError):
+            setattr(signed_transaction, name, None)
+
+
+def test_signature_is_frozen(signed_transaction):
+    to_json = signed_transaction.to_json()
+    with pytest.raises(TypeError):
+        signed_transaction.signature['signature'] = [1, 2]
+    with pytest.raises(TypeError):
+        signed_transaction.signature['signature'][0] = 1
+    with pytest.raises(AttributeError):
+        signed_transaction.signature['signature'].append(1)
+
+    # serialize returns a copy
+    signed_transaction.serialize()['signature']['p'] = 1
+    assert signed_transaction.to_json() == to_json == json.dumps(signed_transaction.serialize())
+    assert signed_transaction.verify()
+
+
+def test_deserialize(signed_transaction):
+    transaction = Transaction.deserialize(json.loads(signed_transaction.to_json()))
+    assert transaction.to_json() == signed_transaction.to_json()
+    assert transaction.cache_key() == signed_transaction.cache_key()
+    assert transaction.check_signature()
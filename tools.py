@@ -2,21 +2,34 @@
 
 import random
 import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Event
+
+from modexp import modexp
 
 """
     This module provides some useful functions
         : generate random 512 integer
         : comute the PGCD(a,b)
         : find safe prime numbers
-        : fast exponentiation
+        : fast exponentiation, multi exponentiation
         : inverse calculation in Z_p
         : find a generator in Z_p
+        : group parameters (p, q, alpha) cache, persisted next to the prime files
 """
 
 
 mask_512 = (1 << 512) - 1
 state = random.randint(0, 2**512-1)
 
+# small primes of the safe prime sieve, number of candidates per sieve window
+SIEVE_PRIMES_BOUND = 20000
+SIEVE_WINDOW_SIZE = 4096
+
+# the multi exponentiation table has 2 ^ MULTI_EXPONENTIATION_TABLE_BITS entries
+MULTI_EXPONENTIATION_TABLE_BITS = 6
+
 """
     Implementation of 512 bits Xorshift
 """
@@ -24,42 +37,238 @@ state = random.randint(0, 2**512-1)
 
 def random_512_bits_integer():
     global state
-    x = state
+    state = xorshift_512(state)
+    return state
+
+
+def xorshift_512(x):
     x = x ^ (x << 13) & mask_512
     x = x ^ (x >> 17) & mask_512
     x = x ^ (x << 5) & mask_512
-    state = x
     return x
 
 
 """
-    Find a 512 safe prime number, with Rabin Miller test
+    Independent 512 bits Xorshift, seeded by the OS random source
+    (one per safe prime worker process)
+"""
+
+
+class Xorshift512:
+    def __init__(self, seed=None):
+        self.state = seed if seed else int.from_bytes(os.urandom(64), "little") | 1
+
+    def random_512_bits_integer(self):
+        self.state = xorshift_512(self.state)
+        return self.state
+
+
+"""
+    Odd primes under 'bound', with the inverse of 4 modulo each of them
+    (Eratosthenes sieve)
+"""
+
+
+def small_primes(bound):
+    is_prime = bytearray([1]) * bound
+    is_prime[:2] = b"\0\0"
+    for i in range(2, int(bound ** 0.5) + 1):
+        if is_prime[i]:
+            is_prime[i*i::i] = bytes(len(range(i*i, bound, i)))
+    return [(p, modular_inverse(4, p)) for p in range(3, bound) if is_prime[p]]
+
+
+"""
+    Inverse of a mod n, a and n coprime
+"""
+
+
+def modular_inverse(a, n):
+    _, __, a_inv = PGCD_bezout(a % n, n)
+    return a_inv % n
+
+
+"""
+    Inverses of every value of 'values' mod n (Montgomery's trick) :
+    a single inversion of the product of the values, then 3 multiplications
+    per value
+"""
+
+
+def mod_inverse_many(values, n):
+    # prefix_products[i] : product of values[:i] mod n
+    prefix_products = [1]
+    for value in values:
+        prefix_products.append(prefix_products[-1] * value % n)
+
+    g, _, inverse = PGCD_bezout(prefix_products[-1], n)
+    if g != 1:
+        raise ValueError("mod_inverse_many : a value is not invertible")
+
+    inverse = inverse % n
+    inverses = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        inverses[i] = inverse * prefix_products[i] % n
+        inverse = inverse * values[i] % n
+    return inverses
+
+
+"""
+    Jacobi symbol (a / n), n odd positive integer :
+    for a prime n, 1 if a is a quadratic residue mod n, -1 if not, 0 if n divides a
+
+        > binary algorithm (quadratic reciprocity), no exponentiation
+"""
+
+
+def jacobi_symbol(a, n):
+    a = a % n
+    result = 1
+    while a != 0:
+        while a % 2 == 0:
+            a = a // 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a = a % n
+    return result if n == 1 else 0
+
+
+"""
+    Sieve of the safe prime candidates start + 4k, 0 <= k < window_size
+    (start = 3 mod 4, so q = (n-1)/2 is odd)
+
+        > n and q are not divisible by the small prime p when n mod p is not 0 or 1,
+            the candidates with n = 0 or 1 mod p are k = (residue - start) * 4^-1 mod p
+"""
+
+
+def sieve_safe_prime_candidates(start, window_size):
+    survivors = bytearray([1]) * window_size
+    for p, inverse_4 in SIEVE_PRIMES:
+        start_residue = start % p
+        for residue in (0, 1):
+            k = (residue - start_residue) * inverse_4 % p
+            survivors[k::p] = bytes(len(range(k, window_size, p)))
+    return [start + 4 * k for k in range(window_size) if survivors[k]]
+
+
+"""
+    Base 2 Fermat test on n, odd integer
+"""
+
+
+def fermat_test(n):
+    return modexp(2, n - 1, n) == 1
+
+
+"""
+    Find a 512 safe prime number n = 2q + 1 :
+        : sieve of a window of candidates with the small primes, for both n and q
+        : base 2 Fermat test, then Rabin Miller test, on q then n
 """
 
 
 def find_safe_512_bits_prime():
-    n = random_512_bits_integer()
-    while len(bin(n)) != 514:
-        n = random_512_bits_integer()
+    n = random_safe_prime_start(random_512_bits_integer)
 
     print("n : "+str(n)+" bit : "+str(len(bin(n))))
 
-    if n % 2 == 0:
-        n = n-1
+    while len(bin(n)) == 514:
+        safe_prime = search_safe_prime_window(n)
+        if safe_prime is not None:
+            print(f"{safe_prime} is safe prime : q : {(safe_prime-1)//2}")
+            return safe_prime
+        n = n + 4 * SIEVE_WINDOW_SIZE
+
+    # the window went over 512 bits, start again
+    return find_safe_512_bits_prime()
+
+
+"""
+    Returns a random 512 bits start of window, n = 3 mod 4
+"""
+
+
+def random_safe_prime_start(random_512_bits):
+    n = random_512_bits()
+    while len(bin(n)) != 514:
+        n = random_512_bits()
+    return n - n % 4 + 3
+
+
+"""
+    Returns the first safe prime of the window starting at 'start',
+    None if there is none or if 'stop_event' is set during the search
+"""
 
-    while True:
-        # skip obvious not prime numbers
-        if (n % 3 != 0) or (n % 5 != 0) or (n % 7 != 0) or (n % 9 != 0) or \
-            (n % 11 != 0) or (n % 13 != 0) or (n % 13 != 0) or \
-            (n % 17 != 0) or (n % 19 != 0) or (n % 21 != 0) or (n % 23 != 0) or \
-                (n % 25 != 0) or (n % 27 != 0) or (n % 29 != 0):
 
-            if rabin_Miller_test(n) == True:
-                q = (n-1)//2
-                if rabin_Miller_test(q) == True:
-                    print(f"{n} is safe prime : q : {q}")
-                    return n
-        n = n+2
+def search_safe_prime_window(start, stop_event=None):
+    for candidate in sieve_safe_prime_candidates(start, SIEVE_WINDOW_SIZE):
+        if stop_event is not None and stop_event.is_set():
+            return None
+        q = (candidate-1)//2
+        if fermat_test(q) and fermat_test(candidate) and \
+                rabin_Miller_test(q) and rabin_Miller_test(candidate):
+            if len(bin(candidate)) == 514:
+                return candidate
+    return None
+
+
+"""
+    Parallel safe prime search : each worker process searches random windows
+    with its own generator, the search stops once 'count' safe primes are found
+        : progress_callback(safe_primes_found, windows_searched), after each window
+"""
+
+
+def find_safe_512_bits_primes_parallel(count=2, workers=None, progress_callback=None):
+    if workers is None:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    stop_event = Event()
+    safe_primes = []
+    windows_searched = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_safe_prime_worker,
+                             initargs=(stop_event,)) as pool:
+        jobs = {pool.submit(safe_prime_window_job) for _ in range(workers)}
+        while len(safe_primes) < count:
+            done_jobs, jobs = wait(jobs, return_when=FIRST_COMPLETED)
+            for job in done_jobs:
+                safe_prime = job.result()
+                windows_searched = windows_searched + 1
+                if safe_prime is not None and len(safe_primes) < count:
+                    safe_primes.append(safe_prime)
+                if progress_callback is not None:
+                    progress_callback(len(safe_primes), windows_searched)
+                if len(safe_primes) < count:
+                    jobs.add(pool.submit(safe_prime_window_job))
+
+        # cancel the waiting jobs and stop the running ones
+        stop_event.set()
+        for job in jobs:
+            job.cancel()
+
+    return safe_primes
+
+
+worker_generator = None
+worker_stop_event = None
+
+
+def init_safe_prime_worker(stop_event):
+    global worker_generator, worker_stop_event
+    # forked workers inherit the parent random states : seed them again
+    random.seed(os.urandom(32))
+    worker_generator = Xorshift512()
+    worker_stop_event = stop_event
+
+
+def safe_prime_window_job():
+    start = random_safe_prime_start(worker_generator.random_512_bits_integer)
+    return search_safe_prime_window(start, worker_stop_event)
 
 
 """
@@ -77,17 +286,15 @@ def rabin_Miller_test(n, iterations=5):
         s = s+1
     d = n_minus_one
 
-    it = 0
-
     for i in range(iterations):
         a = random.randint(2, n-1)
-        x = fast_exponentiation(a, d, mod=n)
+        x = modexp(a, d, n)
 
         if (x == 1) or (x == n-1):
             continue
 
         for r in range(1, s):
-            x = (x**2) % n
+            x = x * x % n
             if x == 1:
                 return False
             if x == n-1:
@@ -103,16 +310,44 @@ def rabin_Miller_test(n, iterations=5):
 
 
 def fast_exponentiation(a, b, mod=1):
-    result = 1
-    i = 1
-    while b != 0:
-        if b % 2 == 1:
-            result = (result * a) % mod
-        a = (a*a) % mod
+    return modexp(a, b, mod)
 
-        i = i+1
-        b = b//2
 
+"""
+    Compute the product of bases[j] ^ exponents[j] mod n in a single pass
+    (Shamir's trick) : the squarings are shared by all the bases,
+    the exponents are read by joint windows of 'window_size' bits and each
+    window costs one multiplication by a precomputed product of powers
+"""
+
+
+def multi_exponentiation(bases, exponents, mod, window_size=None):
+    if window_size is None:
+        window_size = max(1, MULTI_EXPONENTIATION_TABLE_BITS // len(bases))
+    mask = (1 << window_size) - 1
+
+    # table[index] : product of bases[j] ^ (window j of index)
+    table = [1 % mod]
+    for index in range(1, 1 << (window_size * len(bases))):
+        j = 0
+        while (index >> (window_size * j)) & mask == 0:
+            j = j+1
+        table.append(table[index - (1 << (window_size * j))] * bases[j] % mod)
+
+    number_of_windows = -(-max(exponent.bit_length() for exponent in exponents) // window_size)
+    indexes = [0] * number_of_windows
+    for j, exponent in enumerate(exponents):
+        shift = window_size * j
+        for window in range(number_of_windows):
+            indexes[window] |= (exponent & mask) << shift
+            exponent = exponent >> window_size
+
+    result = 1 % mod
+    for index in reversed(indexes):
+        for _ in range(window_size):
+            result = result * result % mod
+        if index:
+            result = result * table[index] % mod
     return result
 
 
@@ -127,64 +362,111 @@ def find_generator(safe_prime):
 
     for alpha in range(2, safe_prime-1):
         i = i+1
-        if (alpha ** 2 % safe_prime) == 1:
+        if alpha * alpha % safe_prime == 1:
             continue
-        if fast_exponentiation(alpha, q, mod=safe_prime) == 1:
+        if modexp(alpha, q, safe_prime) == 1:
             continue
         return alpha
 
 
 """
     Extended Euclide algorithm, y_n is the inverse of a mod b
+    (only the last two terms of each sequence are kept)
 """
 
 
 def PGCD_bezout(a, b):
     if a < b:
         a, b = b, a
-    r = [a, b]
-    q = []
-    x = [1, 0]
-    y = [0, 1]
-    i = 2
+    r_previous, r_current = a, b
+    x_previous, x_current = 1, 0
+    y_previous, y_current = 0, 1
+    # length of the sequences
+    n = 2
 
-    while r[len(r)-1] != 0:
+    while r_current != 0:
+        q_i = r_previous // r_current
+        r_previous, r_current = r_current, r_previous - q_i * r_current
+        x_previous, x_current = x_current, q_i * x_current + x_previous
+        y_previous, y_current = y_current, q_i * y_current + y_previous
+        n = n+1
 
-        q_i = r[i-2]//r[i-1]
-        r_i = r[i-2] % r[i-1]
+    x_n = x_previous if n % 2 == 0 else -x_previous
+    y_n = -y_previous if n % 2 == 0 else y_previous
 
-        q.append(q_i)
-        r.append(r_i)
+    return r_previous, x_n, y_n
 
-        x.append(q_i*x[i-1] + x[i-2])
-        y.append(q_i*y[i-1] + y[i-2])
 
-        i = i+1
+# group parameters (p, q, alpha) by safe prime
+group_parameters_cache = {}
 
-    x_n = (-1)**(len(x)) * x[len(x)-2]
-    y_n = (-1)**(len(y) + 1) * y[len(y)-2]
+GROUP_FILE_SUFFIX = "_group"
 
-    return r[len(r)-2], x_n, y_n
 
+"""
+    Returns the group parameters (p, q, alpha) of the safe prime p,
+    the generator is only searched once per safe prime
+"""
 
-if __name__ == '__main__':
 
-    with open("alice_safe_512_prime_1", "r") as file:
-        safe_prime = int(file.read())
-        alpha = find_generator(safe_prime)
-        print(alpha)
+def group_parameters(safe_prime):
+    if safe_prime not in group_parameters_cache:
+        group_parameters_cache[safe_prime] = (safe_prime, (safe_prime-1)//2, find_generator(safe_prime))
+    return group_parameters_cache[safe_prime]
 
-    with open("alice_safe_512_prime_2", "r") as file:
-        safe_prime = int(file.read())
-        alpha = find_generator(safe_prime)
-        print(alpha)
 
-    with open("bob_safe_512_prime_1", "r") as file:
-        safe_prime = int(file.read())
-        alpha = find_generator(safe_prime)
-        print(alpha)
+"""
+    Group parameters sidecar file : p, q and alpha in hexadecimal
+    followed by the crc32 of this text
+"""
+
+
+def save_group_parameters(parameters, file_name):
+    text = " ".join(f"{value:x}" for value in parameters)
+    with open(file_name, "w") as file:
+        file.write(f"{text} {zlib.crc32(text.encode()):08x}")
 
-    with open("bob_safe_512_prime_2", "r") as file:
+
+# returns the parameters stored in 'file_name', None if the file is missing or corrupted
+def load_group_parameters(file_name):
+    try:
+        with open(file_name, "r") as file:
+            text, _, checksum = file.read().strip().rpartition(" ")
+        p, q, alpha = (int(value, 16) for value in text.split(" "))
+    except (FileNotFoundError, ValueError):
+        return None
+    if f"{zlib.crc32(text.encode()):08x}" != checksum or q != (p-1)//2:
+        return None
+    return p, q, alpha
+
+
+"""
+    Reads the safe prime of 'file_name' and puts its group parameters in
+    the cache, from the sidecar file when it is valid, computed and saved
+    to the sidecar file otherwise
+"""
+
+
+def load_safe_prime(file_name):
+    with open(file_name, "r") as file:
         safe_prime = int(file.read())
-        alpha = find_generator(safe_prime)
+
+    if safe_prime not in group_parameters_cache:
+        parameters = load_group_parameters(file_name + GROUP_FILE_SUFFIX)
+        if parameters is not None and parameters[0] == safe_prime:
+            group_parameters_cache[safe_prime] = parameters
+        else:
+            save_group_parameters(group_parameters(safe_prime), file_name + GROUP_FILE_SUFFIX)
+    return safe_prime
+
+
+SIEVE_PRIMES = small_primes(SIEVE_PRIMES_BOUND)
+
+
+if __name__ == '__main__':
+
+    for file_name in ["alice_safe_512_prime_1", "alice_safe_512_prime_2",
+                      "bob_safe_512_prime_1", "bob_safe_512_prime_2"]:
+        safe_prime = load_safe_prime(file_name)
+        _, __, alpha = group_parameters(safe_prime)
         print(alpha)